@@ -1,4 +1,4 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
 import jwt
@@ -7,12 +7,14 @@ from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import engine, get_async_engine
 from app.models import User
 from app.schemas import TokenPayload
+from app.services.user_cache import user_cache
 
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
@@ -23,20 +25,29 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # 提交后不过期对象，避免在事件循环中触发隐式加载
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+
+
+def check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -44,7 +55,31 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    user = user_cache.get(token_data.sub)
+    if user:
+        # 关联到当前会话，不查询数据库
+        return check_user(session.merge(user, load=False))
+    user = session.get(User, token_data.sub)
+    if user:
+        user_cache.set(user)
+    return check_user(user)
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    user = user_cache.get(token_data.sub)
+    if user:
+        return check_user(await session.merge(user, load=False))
+    user = await session.get(User, token_data.sub)
+    if user:
+        user_cache.set(user)
+    return check_user(user)
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 # def get_current_active_superuser(current_user: CurrentUser) -> User:
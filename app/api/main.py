@@ -1,11 +1,13 @@
 from fastapi import APIRouter
 
-from app.api.routes import jobs, users, login, language, worker
+from app.api.routes import jobs, users, login, language, worker, system, pipelines
 
 api_router = APIRouter()
 
 api_router.include_router(login.router)
 api_router.include_router(users.router)
 api_router.include_router(jobs.router)
+api_router.include_router(pipelines.router)
 api_router.include_router(language.router)
 api_router.include_router(worker.router)
+api_router.include_router(system.router)
@@ -1,20 +1,38 @@
 import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, status
+from celery import states
+from fastapi import APIRouter, Depends, Header, Query, status
+from fastapi.responses import StreamingResponse
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from fastapi_pagination import Page
 from fastapi.exceptions import HTTPException
 from fastapi_pagination.ext.sqlmodel import paginate
-from celery.result import AsyncResult
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import SessionDep, CurrentUser
-from app.models import Job, Team, JobTasks, TeamMember, User
+from app.api.deps import AsyncSessionDep, AsyncCurrentUser
+from app.core.db import get_async_engine
+from app.models import Job, JobDailyStats, JobSchedule, Team, JobTasks, TeamMember, User
 from app.schemas import (
     TeamCreate,
+    TeamUpdate,
     TeamPubilc,
+    TeamQuota,
     JobCreate,
     JobUpdate,
     JobOut,
+    JobRun,
+    JobRunOut,
+    JobDailyStatsOut,
+    JobUsageOut,
+    JobScheduleCreate,
+    JobScheduleUpdate,
+    JobSchedulePublic,
     TaskResultList,
     TaskResult,
     TeamMemberCreate,
@@ -22,189 +40,502 @@ from app.schemas import (
     TeamMemberPublic,
     TeamMemberList,
 )
-from app.services.job import JobService
-from app.tasks.task import execute_script_content
-from app.celery import celery_app
+from app.services.job import JobService, PublishError
+from app.services.quota import QuotaService
+from app.services.schedule import ScheduleService, next_fire, parse_cron
+from app.services.script_store import ScriptStore
+from app.services.task_log import follow_task_log, task_log_exists
+from app.services.task_result import TaskResultService
+from app.utils.pagination import CursorPage, CursorParams, paginate_cursor
 
 
 router = APIRouter(prefix="/team", tags=["Tasks"])
 
+# 异步会话不支持隐式懒加载，响应模型用到的关联需预先加载
+JOB_OPTIONS = (selectinload(Job.language), selectinload(Job.owner))
+
+
+def team_statement():
+    """空间及任务数量，任务数为关联子查询，只统计当前页的空间且不加载任务行"""
+    job_count = select(func.count(Job.id)).where(Job.team_id == Team.id).correlate(Team).scalar_subquery()
+    return select(Team, job_count.label("job_count"))
+
+
+def to_team_public(rows) -> list[TeamPubilc]:
+    return [TeamPubilc.model_validate(team, update={"job_count": job_count}) for team, job_count in rows]
+
 
 @router.get("/", response_model=Page[TeamPubilc])
-def get_teams(session: SessionDep):
+async def get_teams(session: AsyncSessionDep):
     """获取空间列表"""
-    statement = select(Team)
-    return paginate(session, statement)
+    return await paginate(
+        session,
+        team_statement().order_by(Team.id),
+        count_query=select(func.count(Team.id)),
+        transformer=to_team_public,
+    )
 
 
 @router.post("/", response_model=TeamPubilc)
-def create_team(session: SessionDep, current_user: CurrentUser, team_obj: TeamCreate):
+async def create_team(session: AsyncSessionDep, current_user: AsyncCurrentUser, team_obj: TeamCreate):
     """空间创建"""
     team = Team(**team_obj.model_dump(), create_by=current_user.id)
     session.add(team)
-    session.commit()
-    session.refresh(team)
-    return team
+    await session.commit()
+    await session.refresh(team)
+    return TeamPubilc.model_validate(team)
 
 
 @router.get("/{team_id}", response_model=TeamPubilc)
-def get_team(session: SessionDep, team_id: int):
+async def get_team(session: AsyncSessionDep, team_id: int):
     """获取空间详情"""
-    team = session.get(Team, team_id)
+    rows = (await session.exec(team_statement().where(Team.id == team_id))).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Team not found")
+    return to_team_public(rows)[0]
+
+
+@router.patch("/{team_id}", response_model=TeamPubilc)
+async def update_team(session: AsyncSessionDep, team_id: int, team_update: TeamUpdate):
+    """更新空间（名称、描述、运行记录保留天数、运行配额）"""
+    team = await session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    team.sqlmodel_update(team_update.model_dump(exclude_unset=True))
+    team.update_at = datetime.now(timezone.utc)
+    session.add(team)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Team name already exists")
+    return await get_team(session, team_id)
+
+
+@router.get("/{team_id}/quota", response_model=TeamQuota)
+async def get_team_quota(session: AsyncSessionDep, team_id: int):
+    """获取空间运行配额与当前占用"""
+    team = await session.get(Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    return team
+    return await run_in_threadpool(QuotaService.usage, team)
 
 
 @router.delete("/{team_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_team(session: SessionDep, team_id: int):
+async def delete_team(session: AsyncSessionDep, team_id: int):
     """删除空间"""
-    team = session.get(Team, team_id)
+    team = await session.get(Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    session.delete(team)
-    session.commit()
+    await session.delete(team)
+    await session.commit()
 
 
 @router.get("/{team_id}/job", response_model=Page[JobOut])
-def list_jobs(session: SessionDep, team_id: int):
+async def list_jobs(session: AsyncSessionDep, team_id: int):
     """获取任务列表"""
-    statement = select(Job).where(Job.team_id == team_id)
-    return paginate(session, statement)
+    statement = select(Job).where(Job.team_id == team_id).options(*JOB_OPTIONS)
+    return await paginate(session, statement)
+
+
+@router.get("/{team_id}/job/cursor", response_model=CursorPage[JobOut])
+async def list_jobs_cursor(session: AsyncSessionDep, team_id: int, params: Annotated[CursorParams, Depends()]):
+    """获取任务列表（游标分页）"""
+    statement = select(Job).where(Job.team_id == team_id).options(*JOB_OPTIONS)
+    return await paginate_cursor(session, statement, Job, params)
 
 
 @router.post("/{team_id}/job", response_model=JobOut)
-def create_job(session: SessionDep, team_id: int, job_obj: JobCreate, current_user: CurrentUser):
+async def create_job(session: AsyncSessionDep, team_id: int, job_obj: JobCreate, current_user: AsyncCurrentUser):
     """创建任务"""
-    job = JobService.create_job(db=session, job_create=job_obj, team_id=team_id, user_id=current_user.id)
+    if job_obj.script_content:
+        # 写入 Redis 为阻塞 IO，放到线程池执行
+        await run_in_threadpool(ScriptStore.put, job_obj.script_content)
+    job = await session.run_sync(JobService.create_job, job_create=job_obj, team_id=team_id, user_id=current_user.id)
+    await session.refresh(job, ["language", "owner"])
 
     return job
 
 
 @router.delete("/{team_id}/job/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_job(session: SessionDep, team_id: int, job_id: int):
+async def delete_job(session: AsyncSessionDep, team_id: int, job_id: int):
     """删除任务"""
-    job = session.get(Job, job_id)
+    job = await session.get(Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    session.delete(job)
-    session.commit()
+    await session.delete(job)
+    await session.commit()
 
 
 @router.put("/{team_id}/job/{job_id}", response_model=JobOut)
-def update_job(session: SessionDep, team_id: int, job_id: int, job_update: JobUpdate):
+async def update_job(session: AsyncSessionDep, team_id: int, job_id: int, job_update: JobUpdate):
     """更新任务"""
-    job = session.get(Job, job_id)
+    job = await session.get(Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    job = JobService.update_job(db=session, job=job, job_update=job_update)
+    if job_update.script_content:
+        await run_in_threadpool(ScriptStore.put, job_update.script_content)
+    try:
+        job = await session.run_sync(JobService.update_job, job=job, job_update=job_update)
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Job name already exists")
+    await session.refresh(job, ["language", "owner"])
     return job
 
 
+@router.get("/{team_id}/job/{job_id}/stats", response_model=list[JobDailyStatsOut])
+async def get_job_stats(session: AsyncSessionDep, team_id: int, job_id: int, days: int = Query(30, ge=1, le=366)):
+    """获取任务每日运行汇总（最近 days 天）"""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+    statement = (
+        select(JobDailyStats)
+        .where(JobDailyStats.job_id == job_id, JobDailyStats.day >= since)
+        .order_by(JobDailyStats.day)
+    )
+    return (await session.exec(statement)).all()
+
+
+@router.get("/{team_id}/jobs/top-usage", response_model=list[JobUsageOut])
+async def get_top_usage_jobs(
+    session: AsyncSessionDep,
+    team_id: int,
+    metric: Literal["cpu_time", "max_rss", "wall_time"] = "cpu_time",
+    days: int = Query(7, ge=1, le=366),
+    limit: int = Query(10, ge=1, le=100),
+):
+    """空间内最近 days 天资源使用最多的任务：今天之前取每日汇总，今天（UTC）从运行记录实时汇总"""
+    today = datetime.now(timezone.utc).date()
+    names = dict((await session.exec(select(Job.id, Job.name).where(Job.team_id == team_id))).all())
+    if not names:
+        return []
+
+    usage = {job_id: {"runs": 0, "cpu_time": 0.0, "max_rss": None, "wall_time": 0.0} for job_id in names}
+
+    def add(job_id: int, runs: int, cpu_time: float | None, max_rss: int | None, wall_time: float | None):
+        item = usage[job_id]
+        item["runs"] += runs
+        item["cpu_time"] += cpu_time or 0.0
+        item["wall_time"] += wall_time or 0.0
+        if max_rss is not None:
+            item["max_rss"] = max(item["max_rss"] or 0, max_rss)
+
+    daily = select(
+        JobDailyStats.job_id,
+        func.sum(JobDailyStats.total),
+        func.sum(JobDailyStats.cpu_time),
+        func.max(JobDailyStats.max_rss),
+        func.sum(JobDailyStats.wall_time),
+    ).where(
+        JobDailyStats.job_id.in_(list(names)),
+        JobDailyStats.day >= today - timedelta(days=days - 1),
+        JobDailyStats.day < today,
+    )
+    for row in (await session.exec(daily.group_by(JobDailyStats.job_id))).all():
+        add(*row)
+
+    live = select(
+        JobTasks.job_id,
+        func.count(JobTasks.id),
+        func.sum(func.coalesce(JobTasks.cpu_user, 0) + func.coalesce(JobTasks.cpu_system, 0)),
+        func.max(JobTasks.max_rss),
+        func.sum(JobTasks.wall_time),
+    ).where(
+        JobTasks.job_id.in_(list(names)),
+        JobTasks.create_at >= datetime.combine(today, datetime.min.time()),
+    )
+    for row in (await session.exec(live.group_by(JobTasks.job_id))).all():
+        add(*row)
+
+    ranked = sorted(
+        (JobUsageOut(job_id=job_id, name=names[job_id], **item) for job_id, item in usage.items() if item["runs"]),
+        key=lambda item: getattr(item, metric) or 0,
+        reverse=True,
+    )
+    return ranked[:limit]
+
+
+def to_schedule_public(schedule: JobSchedule) -> JobSchedulePublic:
+    return JobSchedulePublic.model_validate(schedule, update={"next_run_at": ScheduleService.next_run_at(schedule)})
+
+
+def check_schedule(schedule: JobSchedule | JobScheduleCreate):
+    if bool(schedule.cron) == bool(schedule.interval):
+        raise HTTPException(status_code=400, detail="Specify either cron or interval")
+    if schedule.cron:
+        try:
+            next_fire(parse_cron(schedule.cron), None, datetime.now(timezone.utc))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cron expression: {e}")
+
+
+@router.get("/{team_id}/job/{job_id}/schedule", response_model=list[JobSchedulePublic])
+async def list_job_schedules(session: AsyncSessionDep, team_id: int, job_id: int):
+    """获取任务的定时计划"""
+    statement = select(JobSchedule).where(JobSchedule.job_id == job_id).order_by(JobSchedule.id)
+    return [to_schedule_public(schedule) for schedule in (await session.exec(statement)).all()]
+
+
+@router.post("/{team_id}/job/{job_id}/schedule", response_model=JobSchedulePublic)
+async def create_job_schedule(
+    session: AsyncSessionDep, team_id: int, job_id: int, schedule_create: JobScheduleCreate
+):
+    """创建定时计划，由调度进程按计划运行任务"""
+    if not await session.get(Job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    check_schedule(schedule_create)
+    schedule = JobSchedule.model_validate(schedule_create, update={"job_id": job_id})
+    session.add(schedule)
+    await session.commit()
+    await session.refresh(schedule)
+    return to_schedule_public(schedule)
+
+
+@router.patch("/{team_id}/job/{job_id}/schedule/{schedule_id}", response_model=JobSchedulePublic)
+async def update_job_schedule(
+    session: AsyncSessionDep, team_id: int, job_id: int, schedule_id: int, schedule_update: JobScheduleUpdate
+):
+    """更新定时计划"""
+    schedule = await session.get(JobSchedule, schedule_id)
+    if not schedule or schedule.job_id != job_id:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    update = schedule_update.model_dump(exclude_unset=True)
+    if update.get("cron") and update.get("interval"):
+        raise HTTPException(status_code=400, detail="Specify either cron or interval")
+    if update.get("cron"):
+        update["interval"] = None
+    elif update.get("interval"):
+        update["cron"] = None
+    schedule.sqlmodel_update(update)
+    check_schedule(schedule)
+    # 调度进程按 update_at 读取变更
+    schedule.update_at = datetime.now(timezone.utc)
+    session.add(schedule)
+    await session.commit()
+    await session.refresh(schedule)
+    return to_schedule_public(schedule)
+
+
+@router.delete("/{team_id}/job/{job_id}/schedule/{schedule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_job_schedule(session: AsyncSessionDep, team_id: int, job_id: int, schedule_id: int):
+    """删除定时计划"""
+    schedule = await session.get(JobSchedule, schedule_id)
+    if not schedule or schedule.job_id != job_id:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    await session.delete(schedule)
+    await session.commit()
+
+
+async def dispatch_jobs(team: Team, jobs: list[Job]) -> list[dict]:
+    """检查配额、投递消息为阻塞 IO，放到线程池执行；broker 不可用时本批运行已撤销，返回 503"""
+    try:
+        return await run_in_threadpool(JobService.dispatch_jobs, team, jobs)
+    except PublishError:
+        raise HTTPException(status_code=503, detail="Task broker unavailable")
+
+
 @router.post("/{team_id}/job/{job_id}", response_model=TaskResult)
-def run_task(session: SessionDep, team_id: int, job_id: int):
+async def run_task(session: AsyncSessionDep, team_id: int, job_id: int):
     """运行任务"""
-    task = session.get(Job, job_id)
+    # 队列由任务语言决定
+    task = await session.get(Job, job_id, options=[selectinload(Job.language), selectinload(Job.team)])
     if not task:
         raise HTTPException(status_code=404, detail="Job not found")
-    result = execute_script_content.apply_async(
-        (task.script_content, "python", {"timeout": 10}), ignore_result=task.ignore_result
-    )
-    job_task = JobTasks(
-        job_id=job_id,
-        task_id=uuid.UUID(result.id),
-    )
+    # 超出配额时排队，记录状态仍为 PENDING
+    [row] = await dispatch_jobs(task.team, [task])
+    job_task = JobTasks(**row)
     session.add(job_task)
-    session.commit()
-    session.refresh(job_task)
+    await session.commit()
+    await session.refresh(job_task)
     return job_task
 
 
+@router.post("/{team_id}/jobs/run", response_model=list[JobRunOut])
+async def run_jobs(session: AsyncSessionDep, team_id: int, job_run: JobRun):
+    """批量运行任务"""
+    team = await session.get(Team, team_id)
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    statement = select(Job).where(Job.team_id == team_id).options(selectinload(Job.language))
+    if not job_run.all:
+        statement = statement.where(Job.id.in_(job_run.job_ids))
+    jobs = (await session.exec(statement.order_by(Job.id))).all()
+    if not job_run.all:
+        missing = set(job_run.job_ids) - {job.id for job in jobs}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Job not found: {sorted(missing)}")
+    if not jobs:
+        return []
+
+    rows = await dispatch_jobs(team, jobs)
+    await session.exec(insert(JobTasks), params=rows)
+    await session.commit()
+    return rows
+
+
+async def attach_results(job_tasks: list[JobTasks]) -> list[TaskResultList]:
+    """结果后端查询为阻塞 IO，放到线程池执行"""
+    return await run_in_threadpool(TaskResultService.attach_results, job_tasks)
+
+
 @router.get("/{team_id}/job/{job_id}/result/", response_model=Page[TaskResultList])
-def list_job_tasks(session: SessionDep, team_id: int, job_id: int):
+async def list_job_tasks(session: AsyncSessionDep, team_id: int, job_id: int, status: str | None = None):
     """获取任务执行结果列表"""
     statement = select(JobTasks).where(JobTasks.job_id == job_id)
-    return paginate(session, statement)
+    if status:
+        statement = statement.where(JobTasks.status == status)
+    statement = statement.order_by(JobTasks.create_at.desc())
+    return await paginate(session, statement, transformer=attach_results)
+
+
+@router.get("/{team_id}/job/{job_id}/result/cursor", response_model=CursorPage[TaskResultList])
+async def list_job_tasks_cursor(
+    session: AsyncSessionDep,
+    team_id: int,
+    job_id: int,
+    params: Annotated[CursorParams, Depends()],
+    status: str | None = None,
+):
+    """获取任务执行结果列表（游标分页，不统计总数）"""
+    statement = select(JobTasks).where(JobTasks.job_id == job_id)
+    if status:
+        statement = statement.where(JobTasks.status == status)
+    return await paginate_cursor(session, statement, JobTasks, params, transformer=attach_results)
 
 
 @router.get("/{team_id}/job/{job_id}/result/{task_id}", response_model=TaskResult)
-def get_task_result(session: SessionDep, team_id: int, job_id: int, task_id: str):
+async def get_task_result(session: AsyncSessionDep, team_id: int, job_id: int, task_id: str):
     """获取celery任务执行结果"""
     statement = select(JobTasks).where((JobTasks.job_id == job_id) & (JobTasks.task_id == uuid.UUID(task_id)))
-    job_task = session.exec(statement).first()
+    job_task = (await session.exec(statement)).first()
     if not job_task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    async_result = AsyncResult(task_id, app=celery_app)
-    return {
-        "task_id": task_id,
-        "create_at": job_task.create_at,
-        "status": async_result.status,
-        "result": async_result.result if async_result.successful() else None,
-        "date_done": async_result.date_done,
-    }
+    result = await run_in_threadpool(TaskResultService.get, task_id)
+    return TaskResultService.to_schema(job_task, result)
+
+
+async def is_task_finished(task_id: str) -> bool:
+    """任务是否已结束（事件落库状态或结果后端状态）"""
+    async with AsyncSession(get_async_engine()) as session:
+        statement = select(JobTasks.status).where(JobTasks.task_id == uuid.UUID(task_id))
+        if (await session.exec(statement)).first() in states.READY_STATES:
+            return True
+    result = await run_in_threadpool(TaskResultService.get, task_id)
+    return result["status"] in states.READY_STATES
+
+
+async def task_log_events(task_id: str, last_id: str):
+    """将任务日志转换为 SSE 消息"""
+    async for item in follow_task_log(task_id, last_id):
+        if item is None:
+            # 无新输出：日志已过期或任务未发布日志时直接结束
+            if not await task_log_exists(task_id) and await is_task_finished(task_id):
+                yield "event: eof\ndata: \n\n"
+                return
+            yield ": keepalive\n\n"
+            continue
+        message_id, stream, data = item
+        lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+        yield f"id: {message_id}\nevent: {stream}\n{lines}\n"
+
+
+@router.get("/{team_id}/job/{job_id}/result/{task_id}/log")
+async def stream_task_log(
+    session: AsyncSessionDep,
+    team_id: int,
+    job_id: int,
+    task_id: str,
+    last_event_id: Annotated[str | None, Header()] = None,
+):
+    """实时获取任务输出（Server-Sent Events），断线重连时通过 Last-Event-ID 续传"""
+    statement = select(JobTasks).where((JobTasks.job_id == job_id) & (JobTasks.task_id == uuid.UUID(task_id)))
+    if not (await session.exec(statement)).first():
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    return StreamingResponse(
+        task_log_events(task_id, last_event_id or "0-0"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.delete("/{team_id}/job/{job_id}/result/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task_result(session: SessionDep, team_id: int, job_id: int, task_id: str):
+async def delete_task_result(session: AsyncSessionDep, team_id: int, job_id: int, task_id: str):
     """删除任务结果"""
     statement = select(JobTasks).where(JobTasks.task_id == uuid.UUID(task_id))
-    task_result = session.exec(statement).first()
+    task_result = (await session.exec(statement)).first()
     if not task_result:
         raise HTTPException(status_code=404, detail="Task result not found")
-    session.delete(task_result)
-    session.commit()
+    await session.delete(task_result)
+    await session.commit()
+    # 同时删除结果后端中的数据
+    await run_in_threadpool(TaskResultService.forget, task_id)
 
 
 @router.post("/{team_id}/members", response_model=TeamMemberPublic)
-def create_team_member(session: SessionDep, team_id: int, member: TeamMemberCreate):
+async def create_team_member(session: AsyncSessionDep, team_id: int, member: TeamMemberCreate):
     """添加空间成员（可指定是否为管理员）"""
-    team = session.get(Team, team_id)
+    team = await session.get(Team, team_id)
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    user = session.get(User, member.user_id)
+    user = await session.get(User, member.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     # 检查是否已存在
     statement = select(TeamMember).where((TeamMember.team_id == team_id) & (TeamMember.user_id == member.user_id))
-    if session.exec(statement).first():
+    if (await session.exec(statement)).first():
         raise HTTPException(status_code=400, detail="User already in team")
     team_member = TeamMember(team_id=team_id, user_id=member.user_id, is_admin=member.is_admin)
     session.add(team_member)
-    session.commit()
-    session.refresh(team_member)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="User already in team")
+    await session.refresh(team_member, ["id", "user"])
     return team_member
 
 
 @router.delete("/{team_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_team_member(session: SessionDep, team_id: int, user_id: int):
+async def remove_team_member(session: AsyncSessionDep, team_id: int, user_id: int):
     """移除空间成员"""
     statement = select(TeamMember).where((TeamMember.team_id == team_id) & (TeamMember.user_id == user_id))
-    member = session.exec(statement).first()
+    member = (await session.exec(statement)).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
-    session.delete(member)
-    session.commit()
+    await session.delete(member)
+    await session.commit()
 
 
 @router.patch("/{team_id}/members/{user_id}", response_model=TeamMemberPublic)
-def update_team_member(session: SessionDep, team_id: int, user_id: int, update: TeamMemberUpdate):
+async def update_team_member(session: AsyncSessionDep, team_id: int, user_id: int, update: TeamMemberUpdate):
     """设置/取消管理员"""
-    statement = select(TeamMember).where((TeamMember.team_id == team_id) & (TeamMember.user_id == user_id))
-    member = session.exec(statement).first()
+    statement = (
+        select(TeamMember)
+        .where((TeamMember.team_id == team_id) & (TeamMember.user_id == user_id))
+        .options(selectinload(TeamMember.user))
+    )
+    member = (await session.exec(statement)).first()
     if not member:
         raise HTTPException(status_code=404, detail="Member not found")
     if update.is_admin is not None:
         member.is_admin = update.is_admin
     session.add(member)
-    session.commit()
-    session.refresh(member)
+    await session.commit()
     return member
 
 
+@router.get("/{team_id}/members/cursor", response_model=CursorPage[TeamMemberList])
+async def list_team_members_cursor(session: AsyncSessionDep, team_id: int, params: Annotated[CursorParams, Depends()]):
+    """获取空间成员列表（游标分页）"""
+    statement = select(TeamMember).where(TeamMember.team_id == team_id).options(selectinload(TeamMember.user))
+    return await paginate_cursor(session, statement, TeamMember, params)
+
+
 @router.get("/{team_id}/members", response_model=Page[TeamMemberList])
-def list_team_members(session: SessionDep, team_id: int):
+async def list_team_members(session: AsyncSessionDep, team_id: int):
     """获取空间成员列表（含管理员标记）"""
-    statement = select(TeamMember).where(TeamMember.team_id == team_id)
+    statement = select(TeamMember).where(TeamMember.team_id == team_id).options(selectinload(TeamMember.user))
 
-    return paginate(session=session, query=statement)
+    return await paginate(session=session, query=statement)
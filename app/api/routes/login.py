@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, status
 from fastapi.exceptions import HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.api.deps import SessionDep
+from app.api.deps import AsyncSessionDep
 from app.services import login
 from app import schemas
 from app.core.config import settings
@@ -15,12 +15,18 @@ router = APIRouter(prefix="/login", tags=["Login"])
 
 
 @router.post("/access-token")
-def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+async def login_access_token(
+    session: AsyncSessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> schemas.Token:
-    # Your logic to validate the user and generate a token goes here.
-
-    user = login.authenticate(session=session, username=form_data.username, password=form_data.password)
+    # 密码校验在独立进程池中进行，不占用 API 线程池
+    try:
+        user = await login.authenticate_async(session=session, username=form_data.username, password=form_data.password)
+    except security.PasswordPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect username or password")
     elif not user.is_active:
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, status
+from fastapi.exceptions import HTTPException
+from fastapi_pagination import Page
+from fastapi_pagination.ext.sqlmodel import paginate
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep
+from app.models import Job, JobTasks, Pipeline, PipelineRun
+from app.schemas import PipelineCreate, PipelinePublic, PipelineRunOut, PipelineUpdate, JobRunOut
+from app.services.pipeline import PipelineService
+
+router = APIRouter(prefix="/team", tags=["Pipelines"])
+
+
+async def get_team_pipeline(session: AsyncSession, team_id: int, pipeline_id: int) -> Pipeline:
+    pipeline = await session.get(Pipeline, pipeline_id)
+    if not pipeline or pipeline.team_id != team_id:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return pipeline
+
+
+async def check_pipeline(session: AsyncSession, team_id: int, job_ids: list[int], edges: list[list[int]]):
+    """节点需为空间内的任务，依赖关系无环"""
+    statement = select(Job.id).where(Job.team_id == team_id, Job.id.in_(job_ids))
+    missing = set(job_ids) - set((await session.exec(statement)).all())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Job not found: {sorted(missing)}")
+    try:
+        PipelineService.validate(job_ids, edges)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def to_run_out(session: AsyncSession, runs: list[PipelineRun]) -> list[PipelineRunOut]:
+    """一次查询加载整页运行的节点记录并汇总状态"""
+    if not runs:
+        return []
+    statement = select(JobTasks).where(JobTasks.pipeline_run_id.in_([run.id for run in runs])).order_by(JobTasks.id)
+    nodes = defaultdict(list)
+    for job_task in (await session.exec(statement)).all():
+        nodes[job_task.pipeline_run_id].append(job_task)
+    pipelines = {}
+    for run in runs:
+        if run.pipeline_id not in pipelines:
+            pipelines[run.pipeline_id] = await session.get(Pipeline, run.pipeline_id)
+    return [
+        PipelineRunOut.model_validate(
+            run,
+            update={
+                **PipelineService.run_summary(pipelines[run.pipeline_id], nodes[run.id]),
+                "nodes": [JobRunOut.model_validate(job_task) for job_task in nodes[run.id]],
+            },
+        )
+        for run in runs
+    ]
+
+
+@router.get("/{team_id}/pipeline", response_model=Page[PipelinePublic])
+async def list_pipelines(session: AsyncSessionDep, team_id: int):
+    """获取流水线列表"""
+    statement = select(Pipeline).where(Pipeline.team_id == team_id).order_by(Pipeline.id)
+    return await paginate(session, statement)
+
+
+@router.post("/{team_id}/pipeline", response_model=PipelinePublic)
+async def create_pipeline(
+    session: AsyncSessionDep, team_id: int, pipeline_create: PipelineCreate, current_user: AsyncCurrentUser
+):
+    """创建流水线：job_ids 为节点，edges 为 [上游任务ID, 下游任务ID] 依赖关系"""
+    edges = [list(edge) for edge in pipeline_create.edges]
+    await check_pipeline(session, team_id, pipeline_create.job_ids, edges)
+    pipeline = Pipeline.model_validate(
+        pipeline_create, update={"team_id": team_id, "create_by": current_user.id, "edges": edges}
+    )
+    session.add(pipeline)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Pipeline name already exists")
+    await session.refresh(pipeline)
+    return pipeline
+
+
+@router.get("/{team_id}/pipeline/{pipeline_id}", response_model=PipelinePublic)
+async def get_pipeline(session: AsyncSessionDep, team_id: int, pipeline_id: int):
+    """获取流水线"""
+    return await get_team_pipeline(session, team_id, pipeline_id)
+
+
+@router.put("/{team_id}/pipeline/{pipeline_id}", response_model=PipelinePublic)
+async def update_pipeline(session: AsyncSessionDep, team_id: int, pipeline_id: int, pipeline_update: PipelineUpdate):
+    """更新流水线"""
+    pipeline = await get_team_pipeline(session, team_id, pipeline_id)
+    update = pipeline_update.model_dump(exclude_unset=True)
+    if "edges" in update:
+        update["edges"] = [list(edge) for edge in update["edges"] or []]
+    job_ids = update.get("job_ids") or pipeline.job_ids
+    await check_pipeline(session, team_id, job_ids, update.get("edges", pipeline.edges))
+    pipeline.sqlmodel_update(update)
+    pipeline.update_at = datetime.now(timezone.utc)
+    session.add(pipeline)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Pipeline name already exists")
+    await session.refresh(pipeline)
+    return pipeline
+
+
+@router.delete("/{team_id}/pipeline/{pipeline_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_pipeline(session: AsyncSessionDep, team_id: int, pipeline_id: int):
+    """删除流水线及其运行记录"""
+    pipeline = await get_team_pipeline(session, team_id, pipeline_id)
+    await session.delete(pipeline)
+    await session.commit()
+
+
+@router.post("/{team_id}/pipeline/{pipeline_id}/run", response_model=PipelineRunOut)
+async def run_pipeline(session: AsyncSessionDep, team_id: int, pipeline_id: int):
+    """运行流水线：无依赖关系的分支并行执行，节点失败时其下游不再执行"""
+    pipeline = await get_team_pipeline(session, team_id, pipeline_id)
+    statement = select(Job).where(Job.team_id == team_id, Job.id.in_(pipeline.job_ids))
+    jobs = (await session.exec(statement.options(selectinload(Job.language)))).all()
+    missing = set(pipeline.job_ids) - {job.id for job in jobs}
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Pipeline jobs not found: {sorted(missing)}")
+
+    # 投递消息为阻塞 IO，放到线程池执行
+    canvas, rows = await run_in_threadpool(PipelineService.dispatch, pipeline, jobs)
+    run = PipelineRun(pipeline_id=pipeline.id, canvas=canvas)
+    session.add(run)
+    await session.flush()
+    await session.exec(insert(JobTasks), params=[{**row, "pipeline_run_id": run.id} for row in rows])
+    await session.commit()
+    await session.refresh(run)
+    return (await to_run_out(session, [run]))[0]
+
+
+@router.get("/{team_id}/pipeline/{pipeline_id}/run", response_model=Page[PipelineRunOut])
+async def list_pipeline_runs(session: AsyncSessionDep, team_id: int, pipeline_id: int):
+    """获取流水线运行记录"""
+    await get_team_pipeline(session, team_id, pipeline_id)
+    statement = select(PipelineRun).where(PipelineRun.pipeline_id == pipeline_id).order_by(PipelineRun.create_at.desc())
+
+    async def transformer(runs: list[PipelineRun]) -> list[PipelineRunOut]:
+        return await to_run_out(session, runs)
+
+    return await paginate(session, statement, transformer=transformer)
+
+
+@router.get("/{team_id}/pipeline/{pipeline_id}/run/{run_id}", response_model=PipelineRunOut)
+async def get_pipeline_run(session: AsyncSessionDep, team_id: int, pipeline_id: int, run_id: int):
+    """获取流水线运行详情"""
+    await get_team_pipeline(session, team_id, pipeline_id)
+    run = await session.get(PipelineRun, run_id)
+    if not run or run.pipeline_id != pipeline_id:
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return (await to_run_out(session, [run]))[0]
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+
+from app.core.db import get_pool_stats
+from app.core.security import password_pool
+from app.services.user_cache import user_cache
+
+router = APIRouter(prefix="/system", tags=["System"])
+
+
+@router.get("/db-pool", response_model=dict[str, dict])
+async def get_db_pool_stats():
+    """获取数据库连接池状态（当前进程）"""
+    return get_pool_stats()
+
+
+@router.get("/user-cache", response_model=dict)
+async def get_user_cache_stats():
+    """获取认证用户缓存命中情况（当前进程）"""
+    return user_cache.stats()
+
+
+@router.get("/password-pool", response_model=dict)
+async def get_password_pool_stats():
+    """获取密码校验进程池排队情况（当前进程）"""
+    return password_pool.stats()
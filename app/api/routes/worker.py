@@ -1,16 +1,56 @@
-from fastapi import APIRouter
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Query
+from fastapi.exceptions import HTTPException
 from fastapi_pagination.ext.sqlmodel import paginate
 from fastapi_pagination import Page
 from sqlmodel import select
 
-from app.api.deps import SessionDep
-from app.models.job import WorkNode
+from app.api.deps import AsyncSessionDep
+from app.models.job import WorkerMetric, WorkNode
+from app.schemas import WorkerMetrics
+from app.services.celery_monitor import monitor_stats
+from app.services.worker_metrics import WorkerMetricsService
 
 router = APIRouter(prefix="/worker", tags=["Worker"])
 
 
 @router.get("/", response_model=Page[WorkNode])
-def list_worker(session: SessionDep):
+async def list_worker(session: AsyncSessionDep):
     """获取所有 worker 的状态"""
     statement = select(WorkNode)
-    return paginate(session, statement)
+    return await paginate(session, statement)
+
+
+@router.get("/stats", response_model=dict[str, int])
+async def get_monitor_stats():
+    """获取 worker 心跳落库统计（当前进程）"""
+    return monitor_stats
+
+
+@router.get("/{node_name}/metrics", response_model=WorkerMetrics)
+async def get_worker_metrics(
+    node_name: str,
+    minutes: int = Query(default=60, ge=1, le=24 * 60, description="最近多少分钟"),
+    step: int = Query(default=0, ge=0, le=3600, description="降采样间隔(秒)，0 返回原始心跳点"),
+):
+    """获取 worker 最近的负载、任务数与内存使用（监控进程内存中的时间序列）"""
+    points = WorkerMetricsService.series(node_name, time.time() - minutes * 60, step)
+    if points is None:
+        raise HTTPException(status_code=404, detail="Worker metrics not found")
+    return WorkerMetrics(node_name=node_name, step=step, points=points)
+
+
+@router.get("/{node_name}/metrics/history", response_model=Page[WorkerMetric])
+async def list_worker_metric_history(
+    session: AsyncSessionDep, node_name: str, hours: int = Query(default=24, ge=1, le=24 * 366)
+):
+    """获取 worker 降采样落库的资源使用记录"""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    statement = (
+        select(WorkerMetric)
+        .where(WorkerMetric.node_name == node_name, WorkerMetric.ts >= since)
+        .order_by(WorkerMetric.ts)
+    )
+    return await paginate(session, statement)
@@ -2,6 +2,7 @@ from celery import Celery
 
 from app.core.config import settings
 from app.services.celery_monitor import start_celery_monitor
+from app.tasks.resources import ResourceReporter
 
 celery_app = Celery("hello", broker=settings.REDIS_BROKER_URL, backend=settings.RESULT_BACKEND_URL)
 
@@ -9,7 +10,10 @@ celery_app = Celery("hello", broker=settings.REDIS_BROKER_URL, backend=settings.
 celery_app.config_from_object("app.core.celeryconfig")
 
 # 加载任务
-celery_app.autodiscover_tasks(["app.tasks.task"])
+celery_app.autodiscover_tasks(["app.tasks.task", "app.tasks.retention"])
+
+# worker 定期上报内存使用
+celery_app.steps["consumer"].add(ResourceReporter)
 
 
 # 启动 Celery 监控
@@ -1,5 +1,7 @@
 """Celery 配置"""
 
+from celery.schedules import crontab
+
 # 任务序列化方式
 task_serializer = "json"
 
@@ -10,3 +12,26 @@ accept_content = ["json"]
 # 时区
 timezone = "Asia/Shanghai"
 enable_utc = True
+
+# 脚本任务按 jobs.{脚本类型}.{优先级} 投递（见 JobService.job_queue），队列在首次使用时自动声明；
+# 定时任务等其余任务使用默认队列
+task_default_queue = "celery"
+task_create_missing_queues = True
+# 每个 worker 额外消费专属队列 {hostname}.dq2，负载感知投递时使用（见 DISPATCH_MODE）
+worker_direct = True
+# 每个进程只预取一条，避免慢任务占住已预取的消息
+worker_prefetch_multiplier = 1
+
+# 发送任务事件，供监控线程记录执行状态
+worker_send_task_events = True
+# 投递时发送 task-sent 事件，用于计算排队等待时间
+task_send_sent_event = True
+# 启用 --autoscale 时按队列积压伸缩进程池
+worker_autoscaler = "app.tasks.autoscale:QueueDepthAutoscaler"
+
+# 定时任务（需启动 celery beat），crontab 按上方时区计算
+beat_schedule = {
+    # 北京时间 08:30 即 UTC 00:30，汇总前一天（UTC）的运行记录
+    "rollup-job-stats": {"task": "app.tasks.retention.rollup_job_stats", "schedule": crontab(hour=8, minute=30)},
+    "purge-job-tasks": {"task": "app.tasks.retention.purge_job_tasks", "schedule": crontab(hour=3, minute=0)},
+}
@@ -1,13 +1,138 @@
+import threading
+import time
 from collections.abc import Generator
+from functools import lru_cache
 
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 from sqlmodel import create_engine, Session
 
 from app.core.config import settings
 from app.schemas.user import UserCreate
 from app.services.user import UserService
 
+
+class PoolStats:
+    """连接池统计：获取连接的等待时间、溢出连接与超时次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_checkout(self, wait_time: float, overflowed: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, wait_time: float):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def snapshot(self, pool: Pool) -> dict:
+        stats = {"pool": pool.__class__.__name__, "status": pool.status()}
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+            )
+        with self._lock:
+            stats.update(
+                checkouts=self.checkouts,
+                wait_time_total=round(self.wait_time_total, 6),
+                wait_time_avg=round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+                wait_time_max=round(self.wait_time_max, 6),
+                overflow_events=self.overflow_events,
+                timeouts=self.timeouts,
+            )
+        return stats
+
+
+class TimedPoolMixin:
+    """记录从连接池获取连接的耗时"""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow = self.overflow()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            # 即 "QueuePool limit ... reached"
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        self.stats.record_checkout(time.perf_counter() - start, overflowed=self.overflow() > max(overflow, 0))
+        return conn
+
+
+def pool_options(database_uri: str, pool_cls: type[QueuePool], stats: PoolStats) -> dict:
+    """按配置生成连接池参数，统计对象挂在类属性上，engine.dispose() 重建连接池后仍然保留"""
+    if make_url(database_uri).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": type(f"Timed{pool_cls.__name__}", (TimedPoolMixin, pool_cls), {"stats": stats}),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
 # connect_args = {"check_same_thread": False}  # 仅SQLite 配置，不同线程中使用同一个数据库
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI, **pool_options(settings.SQLALCHEMY_DATABASE_URI, QueuePool, pool_stats)
+)
+
+# 同步驱动与异步驱动的对应关系
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def get_async_database_uri() -> str:
+    """异步数据库连接地址，未配置时由同步地址推导"""
+    if settings.SQLALCHEMY_ASYNC_DATABASE_URI:
+        return settings.SQLALCHEMY_ASYNC_DATABASE_URI
+    url = make_url(settings.SQLALCHEMY_DATABASE_URI)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    return url.render_as_string(hide_password=False)
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """异步引擎，首次使用时创建（celery worker 等同步进程无需异步驱动）"""
+    database_uri = get_async_database_uri()
+    return create_async_engine(database_uri, **pool_options(database_uri, AsyncAdaptedQueuePool, async_pool_stats))
+
+
+def get_pool_stats() -> dict:
+    """当前进程的连接池状态"""
+    stats = {"sync": pool_stats.snapshot(engine.pool)}
+    if get_async_engine.cache_info().currsize:
+        stats["async"] = async_pool_stats.snapshot(get_async_engine().pool)
+    return stats
 
 
 def init_db(session: Session) -> None:
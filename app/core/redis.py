@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+
+def get_redis_url() -> str:
+    return settings.REDIS_URL or settings.REDIS_BROKER_URL
+
+
+@lru_cache
+def get_redis() -> redis.Redis:
+    """同步 Redis 客户端（worker、监控线程使用）"""
+    return redis.Redis.from_url(get_redis_url())
+
+
+@lru_cache
+def get_broker_redis() -> redis.Redis:
+    """broker 所在的 Redis（读取队列积压）"""
+    return redis.Redis.from_url(settings.REDIS_BROKER_URL)
+
+
+@lru_cache
+def get_async_redis() -> aioredis.Redis:
+    """异步 Redis 客户端（API 使用）"""
+    return aioredis.Redis.from_url(get_redis_url())
@@ -1,12 +1,16 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
 import jwt
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 
 ALGORITHM = "HS256"
@@ -23,5 +27,53 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """校验密码，计算参数变化时同时返回新哈希"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+class PasswordPool:
+    """bcrypt 校验专用进程池
+
+    避免登录高峰占满 API 线程池；排队的校验数超过上限时直接拒绝，而不是无限堆积。
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.rejected = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # API 进程中有后台线程，使用 spawn 避免 fork 带来的锁状态问题
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        self.pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(verify_and_update, plain_password, hashed_password)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), verify_and_update, plain_password, hashed_password)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self.pending, "rejected": self.rejected}
+
+
+password_pool = PasswordPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT)
@@ -1,5 +1,9 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
 from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST
 from starlette.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import (
     get_redoc_html,
@@ -11,6 +15,7 @@ from fastapi_pagination import add_pagination
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.services.metrics import HTTP_REQUEST_SECONDS, MetricsService
 
 
 def custom_generate_unique_id(route: APIRoute):
@@ -67,5 +72,29 @@ if settings.all_cors_origins:
 # 分页
 add_pagination(app)
 
+# 指标：当前进程参与任务事件记录
+MetricsService.enable()
+
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    if settings.METRICS_ENABLED:
+        # 按路由模板区分，未匹配的路径合并，避免标签数随 URL 增长
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, route.path if route else "unmatched", str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 指标，多进程部署时汇总全部进程"""
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    return Response(MetricsService.latest(), media_type=CONTENT_TYPE_LATEST)
+
 # 路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
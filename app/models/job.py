@@ -1,9 +1,9 @@
 import uuid
 from enum import Enum
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import TEXT
+from sqlalchemy import JSON, TEXT, BigInteger, Index, UniqueConstraint
 
 from app.models.user import User
 
@@ -26,6 +26,9 @@ class Team(SQLModel, table=True):
     name: str = Field(max_length=20)
     description: str = Field(sa_type=TEXT(), nullable=True)
     create_by: int = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+    retention_days: int | None = Field(default=None, nullable=True, description="运行记录保留天数，空为全局配置")
+    max_concurrent_runs: int | None = Field(default=None, nullable=True, description="并发运行数上限，空为全局配置")
+    runs_per_minute: int | None = Field(default=None, nullable=True, description="每分钟运行数上限，空为全局配置")
 
     create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     update_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -36,14 +39,29 @@ class Team(SQLModel, table=True):
 class Job(SQLModel, table=True):
     """任务信息表"""
 
+    class Priority(str, Enum):
+        """任务优先级，决定投递的队列"""
+
+        HIGH = "high"
+        NORMAL = "normal"
+        LOW = "low"
+
     __tablename__ = "job"
+    # 同一空间内任务名称唯一（JobService.create_job 按此去重）
+    __table_args__ = (
+        UniqueConstraint("team_id", "name", name="uq_job_team_id_name"),
+        # 游标分页按 (create_at, id) 排序
+        Index("ix_job_team_id_create_at", "team_id", "create_at"),
+    )
 
     id: int = Field(primary_key=True, default=None, description="任务ID")
     name: str = Field(max_length=20, nullable=False, description="任务名称")
     description: str | None = Field(max_length=100, nullable=True, description="任务描述")
     script_content: str | None = Field(sa_type=TEXT(), nullable=True, description="任务脚本内容")
     script_path: str | None = Field(nullable=True, description="脚本文件路径")
+    script_hash: str | None = Field(default=None, max_length=64, nullable=True, index=True, description="脚本SHA-256")
     ignore_result: bool = Field(default=False, nullable=False, description="是否忽略结果")
+    priority: Priority = Field(default=Priority.NORMAL, nullable=False, description="优先级")
 
     language_id: int = Field(foreign_key="language.id")
     team_id: int = Field(foreign_key="team.id", nullable=False, ondelete="CASCADE")
@@ -61,10 +79,107 @@ class JobTasks(SQLModel, table=True):
     """任务执行结果关联表"""
 
     __tablename__ = "job_tasks"
+    # 运行记录按任务查询并按创建时间排序（偏移分页与游标分页共用）
+    __table_args__ = (Index("ix_job_tasks_job_id_create_at", "job_id", "create_at"),)
 
     id: int | None = Field(primary_key=True, default=None, description="主键ID")
     job_id: int = Field(foreign_key="job.id", nullable=False, ondelete="CASCADE", description="任务ID")
-    task_id: uuid.UUID = Field(max_length=36, nullable=False, description="运行ID")
+    task_id: uuid.UUID = Field(max_length=36, nullable=False, unique=True, description="运行ID")
+    status: str = Field(default="PENDING", max_length=20, nullable=False, index=True, description="运行状态")
+    worker: str | None = Field(default=None, max_length=60, nullable=True, description="执行节点")
+    returncode: int | None = Field(default=None, nullable=True, description="脚本退出码")
+    runtime: float | None = Field(default=None, nullable=True, description="执行耗时(秒)")
+    # 脚本进程（含已回收的子进程）的资源使用，超时被终止的运行同样记录
+    cpu_user: float | None = Field(default=None, nullable=True, description="用户态CPU时间(秒)")
+    cpu_system: float | None = Field(default=None, nullable=True, description="内核态CPU时间(秒)")
+    max_rss: int | None = Field(default=None, sa_type=BigInteger(), nullable=True, description="峰值常驻内存(字节)")
+    wall_time: float | None = Field(default=None, nullable=True, description="脚本进程运行时长(秒)")
+    ctx_switches_voluntary: int | None = Field(default=None, nullable=True, description="主动上下文切换次数")
+    ctx_switches_involuntary: int | None = Field(default=None, nullable=True, description="被动上下文切换次数")
+    start_at: datetime | None = Field(default=None, nullable=True, description="开始执行时间")
+    finish_at: datetime | None = Field(default=None, nullable=True, description="执行结束时间")
+    pipeline_run_id: int | None = Field(
+        default=None,
+        foreign_key="pipeline_run.id",
+        nullable=True,
+        ondelete="CASCADE",
+        index=True,
+        description="流水线运行ID",
+    )
+
+    create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class JobDailyStats(SQLModel, table=True):
+    """任务每日运行汇总，运行记录清理后仍保留"""
+
+    __tablename__ = "job_daily_stats"
+    __table_args__ = (UniqueConstraint("job_id", "day", name="uq_job_daily_stats_job_id_day"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    job_id: int = Field(foreign_key="job.id", nullable=False, ondelete="CASCADE", description="任务ID")
+    day: date = Field(nullable=False, description="日期(UTC)")
+    total: int = Field(default=0, nullable=False, description="运行次数")
+    success: int = Field(default=0, nullable=False, description="成功次数")
+    failure: int = Field(default=0, nullable=False, description="失败次数")
+    p50_runtime: float | None = Field(default=None, nullable=True, description="耗时中位数(秒)")
+    p95_runtime: float | None = Field(default=None, nullable=True, description="耗时P95(秒)")
+    cpu_time: float | None = Field(default=None, nullable=True, description="CPU时间合计(秒)")
+    max_rss: int | None = Field(default=None, sa_type=BigInteger(), nullable=True, description="峰值常驻内存(字节)")
+    wall_time: float | None = Field(default=None, nullable=True, description="脚本运行时长合计(秒)")
+
+    create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class JobSchedule(SQLModel, table=True):
+    """任务定时计划表"""
+
+    __tablename__ = "job_schedule"
+    # 调度进程按 update_at 增量读取变更的计划
+    __table_args__ = (Index("ix_job_schedule_update_at", "update_at"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    job_id: int = Field(foreign_key="job.id", nullable=False, ondelete="CASCADE", index=True, description="任务ID")
+    cron: str | None = Field(default=None, max_length=100, nullable=True, description="cron 表达式：分 时 日 月 周")
+    interval: int | None = Field(default=None, nullable=True, description="运行间隔(秒)")
+    enabled: bool = Field(default=True, nullable=False, description="是否启用")
+    last_run_at: datetime | None = Field(default=None, nullable=True, description="上次触发时间")
+
+    create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    update_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    job: Job = Relationship()
+
+
+class Pipeline(SQLModel, table=True):
+    """流水线：空间内任务组成的有向无环图"""
+
+    __tablename__ = "pipeline"
+    __table_args__ = (UniqueConstraint("team_id", "name", name="uq_pipeline_team_id_name"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    name: str = Field(max_length=50, nullable=False, description="流水线名称")
+    description: str | None = Field(default=None, max_length=100, nullable=True, description="流水线描述")
+    job_ids: list[int] = Field(default_factory=list, sa_type=JSON, nullable=False, description="节点任务ID")
+    edges: list[list[int]] = Field(
+        default_factory=list, sa_type=JSON, nullable=False, description="依赖关系 [[上游任务ID, 下游任务ID], ...]"
+    )
+    team_id: int = Field(foreign_key="team.id", nullable=False, ondelete="CASCADE")
+    create_by: int = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+
+    create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    update_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PipelineRun(SQLModel, table=True):
+    """流水线运行记录，各节点的运行记录通过 JobTasks.pipeline_run_id 关联"""
+
+    __tablename__ = "pipeline_run"
+    __table_args__ = (Index("ix_pipeline_run_pipeline_id_create_at", "pipeline_id", "create_at"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    pipeline_id: int = Field(foreign_key="pipeline.id", nullable=False, ondelete="CASCADE", description="流水线ID")
+    canvas: str = Field(max_length=20, nullable=False, description="编排方式：series_parallel / levels")
 
     create_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -82,7 +197,7 @@ class WorkNode(SQLModel, table=True):
 
     id: int | None = Field(primary_key=True, default=None, description="工作节点ID")
     node_ip: str = Field(max_length=15, nullable=False, unique=True, description="节点IP地址")
-    node_name: str = Field(max_length=60, nullable=False)
+    node_name: str = Field(max_length=60, nullable=False, unique=True, description="节点名称")
     status: NodeStatus = Field(default=NodeStatus.OFFLINE, nullable=False, description="节点状态, 1:在线, 2: 离线")
     last_ping: datetime | None = Field(default=None, nullable=True, description="最后心跳时间")
     platform: str | None = Field(default=None, nullable=True, description="操作系统平台")
@@ -91,10 +206,27 @@ class WorkNode(SQLModel, table=True):
     update_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class WorkerMetric(SQLModel, table=True):
+    """worker 资源使用降采样记录，每个落库周期一行"""
+
+    __tablename__ = "worker_metric"
+    __table_args__ = (Index("ix_worker_metric_node_name_ts", "node_name", "ts"),)
+
+    id: int | None = Field(primary_key=True, default=None)
+    node_name: str = Field(max_length=60, nullable=False, description="节点名称")
+    ts: datetime = Field(nullable=False, index=True, description="周期开始时间")
+    load1: float | None = Field(default=None, nullable=True, description="1 分钟平均负载")
+    active: float | None = Field(default=None, nullable=True, description="平均执行中任务数")
+    processed_rate: float | None = Field(default=None, nullable=True, description="任务处理速率(个/秒)")
+    mem_percent: float | None = Field(default=None, nullable=True, description="主机内存使用率(%)")
+    rss: int | None = Field(default=None, nullable=True, description="worker 进程树常驻内存(字节)")
+
+
 class TeamMember(SQLModel, table=True):
     """空间成员表，含管理员标记"""
 
     __tablename__ = "team_member"
+    __table_args__ = (UniqueConstraint("team_id", "user_id", name="uq_team_member_team_id_user_id"),)
 
     id: int | None = Field(primary_key=True, default=None)
     team_id: int = Field(foreign_key="team.id", nullable=False, ondelete="CASCADE")
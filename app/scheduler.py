@@ -0,0 +1,293 @@
+"""任务定时调度进程
+
+    python -m app.scheduler
+
+- 计划按下次触发时间保存在最小堆中，进程只在最早的触发时间、读取变更或续约主节点锁时醒来
+- 按 update_at 增量读取新增和修改的计划，不重复扫描全表；删除的计划在触发时发现并丢弃
+- 通过 Redis 锁保证同一时间只有一个实例在调度，其余实例待命，主节点退出后接管
+- 到期的运行经 JobService.dispatch_jobs 投递，与手动运行一样受空间配额限制
+"""
+
+import heapq
+import itertools
+import logging
+import signal
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from celery.schedules import crontab
+from redis.exceptions import RedisError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.models import Job, JobSchedule, JobTasks
+from app.services.job import JobService, PublishError
+from app.services.schedule import as_utc, next_fire, parse_cron
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "scheduler:leader"
+# 只有持有者才能续约
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# 增量读取时回看的时间，覆盖提交晚于 update_at 的长事务与各节点的时钟偏差
+POLL_OVERLAP = timedelta(seconds=60)
+# 触发时按批读取计划
+FIRE_BATCH_SIZE = 1000
+# 投递失败（broker 不可用）的计划在该秒数后重试
+FIRE_RETRY_DELAY = 5
+
+
+@dataclass
+class Entry:
+    """内存中的计划"""
+
+    update_at: datetime
+    cron: crontab | None
+    interval: int | None
+    version: int
+
+
+class Scheduler:
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.is_leader = False
+        self.entries: dict[int, Entry] = {}
+        # (触发时间戳, 计划ID, 版本)；计划变更时压入新版本，旧版本出堆时丢弃
+        self.heap: list[tuple[float, int, int]] = []
+        self.versions = itertools.count()
+        self.watermark: datetime | None = None
+        self.stopping = threading.Event()
+        self.stats = {"loaded": 0, "fired": 0, "dispatched": 0}
+
+    # 主节点锁
+
+    def acquire_leadership(self) -> bool:
+        ttl = settings.SCHEDULER_LOCK_TTL * 1000
+        try:
+            redis = get_redis()
+            if self.is_leader:
+                self.is_leader = bool(redis.eval(RENEW_SCRIPT, 1, LEADER_KEY, self.token, ttl))
+                if not self.is_leader:
+                    logger.warning("Lost scheduler leadership")
+            else:
+                self.is_leader = bool(redis.set(LEADER_KEY, self.token, nx=True, px=ttl))
+                if self.is_leader:
+                    logger.info("Acquired scheduler leadership")
+        except RedisError as e:
+            # 无法确认锁仍属于自己时停止调度，避免与新的主节点重复触发
+            logger.warning("Renew scheduler leadership failed: %s", e)
+            self.is_leader = False
+        if not self.is_leader:
+            self.reset()
+        return self.is_leader
+
+    def release_leadership(self):
+        if not self.is_leader:
+            return
+        try:
+            get_redis().eval(RENEW_SCRIPT, 1, LEADER_KEY, self.token, 1)
+        except RedisError:
+            pass
+        self.is_leader = False
+
+    def reset(self):
+        """失去主节点后丢弃内存状态，再次成为主节点时全量加载"""
+        self.entries.clear()
+        self.heap.clear()
+        self.watermark = None
+
+    # 计划加载
+
+    def poll(self):
+        """读取 watermark 之后变更的计划，首次调用时全量加载"""
+        statement = select(JobSchedule).order_by(JobSchedule.update_at)
+        if self.watermark is not None:
+            statement = statement.where(JobSchedule.update_at > self.watermark - POLL_OVERLAP)
+        with Session(engine) as session:
+            schedules = session.exec(statement).all()
+        for schedule in schedules:
+            self.track(schedule)
+            if self.watermark is None or schedule.update_at > self.watermark:
+                self.watermark = schedule.update_at
+        if self.watermark is None:
+            # 空表，之后从当前时间开始增量读取
+            self.watermark = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def track(self, schedule: JobSchedule):
+        entry = self.entries.get(schedule.id)
+        if entry and entry.update_at == schedule.update_at:
+            # 回看窗口内未变化的计划
+            return
+        if not schedule.enabled:
+            self.entries.pop(schedule.id, None)
+            return
+        if not schedule.cron and not schedule.interval:
+            self.entries.pop(schedule.id, None)
+            return
+        try:
+            cron = parse_cron(schedule.cron) if schedule.cron else None
+            # 错过的触发（调度进程停止期间）立即补跑一次
+            fire_at = next_fire(cron, schedule.interval, as_utc(schedule.last_run_at or schedule.create_at))
+        except ValueError as e:
+            logger.warning("Skip schedule %s with invalid cron %r: %s", schedule.id, schedule.cron, e)
+            self.entries.pop(schedule.id, None)
+            return
+        entry = Entry(schedule.update_at, cron, schedule.interval, next(self.versions))
+        self.entries[schedule.id] = entry
+        self.stats["loaded"] += 1
+        self.push(schedule.id, entry, fire_at)
+
+    def push(self, schedule_id: int, entry: Entry, fire_at: datetime):
+        heapq.heappush(self.heap, (fire_at.timestamp(), schedule_id, entry.version))
+
+    # 触发
+
+    def pop_due(self, now: float) -> list[tuple[int, float]]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, schedule_id, version = heapq.heappop(self.heap)
+            if self.is_current(schedule_id, version):
+                due.append((schedule_id, fire_at))
+        # 旧版本过多时重建堆
+        if len(self.heap) > 2 * len(self.entries) + 1024:
+            self.heap = [item for item in self.heap if self.is_current(item[1], item[2])]
+            heapq.heapify(self.heap)
+        return due
+
+    def is_current(self, schedule_id: int, version: int) -> bool:
+        entry = self.entries.get(schedule_id)
+        return entry is not None and entry.version == version
+
+    def fire(self, due: list[tuple[int, float]]):
+        for offset in range(0, len(due), FIRE_BATCH_SIZE):
+            self.fire_batch(dict(due[offset : offset + FIRE_BATCH_SIZE]))
+
+    def fire_batch(self, due: dict[int, float]):
+        """按最新的计划与任务投递到期的运行，并安排下一次触发
+
+        按空间逐个投递，每个空间投递后立即写入运行记录与触发时间：后续空间失败时，已投递的运行不会在重新加载后重复触发。
+        投递失败的计划在 FIRE_RETRY_DELAY 秒后重试。
+        """
+        statement = (
+            select(JobSchedule)
+            .where(JobSchedule.id.in_(list(due)))
+            .options(selectinload(JobSchedule.job).selectinload(Job.language))
+            .options(selectinload(JobSchedule.job).selectinload(Job.team))
+        )
+        dispatched = 0
+        with Session(engine) as session:
+            schedules = {schedule.id: schedule for schedule in session.exec(statement).all()}
+            # 空间 -> [(计划ID, 任务)]
+            due_by_team = defaultdict(list)
+            for schedule_id in due:
+                schedule = schedules.get(schedule_id)
+                if schedule is None or not schedule.enabled or schedule.job is None:
+                    # 计划已删除或已停用，增量读取尚未发现
+                    self.entries.pop(schedule_id, None)
+                    continue
+                due_by_team[schedule.job.team_id].append((schedule_id, schedule.job))
+
+            for team_due in due_by_team.values():
+                jobs = [job for _, job in team_due]
+                try:
+                    sent = dict(enumerate(JobService.dispatch_jobs(jobs[0].team, jobs)))
+                except PublishError as e:
+                    logger.warning("Dispatch scheduled runs for team %s failed: %s", jobs[0].team_id, e.__cause__)
+                    sent = e.sent_rows
+                    retry_at = datetime.now(timezone.utc) + timedelta(seconds=FIRE_RETRY_DELAY)
+                    for index, (schedule_id, _) in enumerate(team_due):
+                        if index not in sent:
+                            self.push(schedule_id, self.entries[schedule_id], retry_at)
+                fired = [team_due[index][0] for index in sent]
+                self.record(session, fired, list(sent.values()), due)
+                dispatched += len(sent)
+
+        self.stats["fired"] += len(due)
+        self.stats["dispatched"] += dispatched
+        if dispatched:
+            logger.info("Dispatched %d scheduled runs", dispatched)
+
+    def record(self, session: Session, fired: list[int], rows: list[dict], due: dict[int, float]):
+        """写入已投递的运行与计划的触发时间，并安排下一次触发"""
+        if rows:
+            session.execute(insert(JobTasks), rows)
+        if fired:
+            # 按主键批量更新；不修改 update_at，避免增量读取把触发当作计划变更
+            params = [
+                {"id": schedule_id, "last_run_at": datetime.fromtimestamp(due[schedule_id], timezone.utc)}
+                for schedule_id in fired
+            ]
+            session.execute(update(JobSchedule), params)
+        session.commit()
+
+        now = datetime.now(timezone.utc)
+        for schedule_id in fired:
+            entry = self.entries[schedule_id]
+            fire_at = next_fire(entry.cron, entry.interval, datetime.fromtimestamp(due[schedule_id], timezone.utc))
+            if fire_at <= now:
+                # 落后超过一个周期时跳过错过的触发
+                fire_at = next_fire(entry.cron, entry.interval, now)
+            self.push(schedule_id, entry, fire_at)
+
+    # 主循环
+
+    def run(self):
+        renew_interval = settings.SCHEDULER_LOCK_TTL / 3
+        next_renew = next_poll = 0.0
+        while not self.stopping.is_set():
+            now = time.time()
+            if now >= next_renew:
+                next_renew = now + renew_interval
+                if not self.acquire_leadership():
+                    self.stopping.wait(renew_interval)
+                    continue
+                if self.watermark is None:
+                    # 刚成为主节点，立即全量加载
+                    next_poll = now
+            try:
+                if now >= next_poll:
+                    next_poll = now + settings.SCHEDULER_POLL_INTERVAL
+                    self.poll()
+                due = self.pop_due(time.time())
+                if due:
+                    self.fire(due)
+            except Exception:
+                logger.exception("Scheduler loop failed")
+                # 丢弃内存状态，下次全量加载后重试
+                self.reset()
+                next_poll = 0.0
+                self.stopping.wait(1)
+                continue
+            wake_at = min(next_renew, next_poll, self.heap[0][0] if self.heap else next_poll)
+            self.stopping.wait(max(wake_at - time.time(), 0))
+        self.release_leadership()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+
+def main():
+    scheduler = Scheduler()
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    logger.info("Scheduler started")
+    scheduler.run()
+    logger.info("Scheduler stopped: %s", scheduler.stats)
+
+
+if __name__ == "__main__":
+    main()
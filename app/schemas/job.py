@@ -1,12 +1,11 @@
 import uuid
 from typing import Any, Literal
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
 from sqlmodel import SQLModel, TEXT
-from pydantic import computed_field, field_serializer, Field
-from celery.result import AsyncResult
+from pydantic import AliasChoices, computed_field, model_validator, Field
 
-from app.models.job import Language, Team, WorkNode
+from app.models.job import Job, Language, Team, WorkNode
 from app.schemas.user import UserPubic
 
 
@@ -26,8 +25,18 @@ class TeamCreate(TeamBase):
 class TeamUpdate(SQLModel):
     """任务组更新"""
 
-    name: str | None
-    description: str | None
+    name: str | None = Field(default=None, max_length=20)
+    description: str | None = None
+    retention_days: int | None = Field(default=None, ge=1, description="运行记录保留天数")
+    max_concurrent_runs: int | None = Field(default=None, ge=0, description="并发运行数上限，0 表示不限制")
+    runs_per_minute: int | None = Field(default=None, ge=0, description="每分钟运行数上限，0 表示不限制")
+
+    @model_validator(mode="after")
+    def check_name(self):
+        # 名称不可置空；配额等字段显式传 null 表示恢复全局配置
+        if "name" in self.model_fields_set and self.name is None:
+            raise ValueError("name cannot be null")
+        return self
 
 
 class TeamPubilc(SQLModel):
@@ -37,15 +46,14 @@ class TeamPubilc(SQLModel):
     name: str
     description: str
     create_by: int
+    retention_days: int | None = None
+    max_concurrent_runs: int | None = None
+    runs_per_minute: int | None = None
 
     create_at: datetime
     update_at: datetime
 
-    jobs: list["JobOut"] = Field(serialization_alias="job_count")
-
-    @field_serializer("jobs")
-    def job_count(self, jobs: list["JobOut"]) -> int:
-        return len(self.jobs)
+    job_count: int = Field(default=0, description="任务数量")
 
 
 class JobBase(SQLModel):
@@ -53,6 +61,7 @@ class JobBase(SQLModel):
     description: str | None = None
     script_content: str | None = None
     script_path: str | None = None
+    priority: Job.Priority = Job.Priority.NORMAL
 
 
 class JobOut(JobBase):
@@ -73,9 +82,57 @@ class JobUpdate(SQLModel):
     script_content: str | None = None
     script_path: str | None = None
     ignore_result: bool | None = None
+    priority: Job.Priority | None = None
     language_id: int | None = None
 
 
+class JobRun(SQLModel):
+    """批量运行任务，指定任务ID列表或空间内全部任务"""
+
+    job_ids: list[int] | None = Field(default=None, description="任务ID列表")
+    all: bool = Field(default=False, description="运行空间内全部任务")
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if bool(self.job_ids) == self.all:
+            raise ValueError("Specify either job_ids or all")
+        return self
+
+
+class JobScheduleBase(SQLModel):
+    cron: str | None = Field(default=None, max_length=100, description="cron 表达式：分 时 日 月 周（Asia/Shanghai）")
+    interval: int | None = Field(default=None, ge=1, description="运行间隔(秒)")
+    enabled: bool = True
+
+
+class JobScheduleCreate(JobScheduleBase):
+    """定时计划创建，cron 与 interval 二选一"""
+
+    @model_validator(mode="after")
+    def check_trigger(self):
+        if bool(self.cron) == bool(self.interval):
+            raise ValueError("Specify either cron or interval")
+        return self
+
+
+class JobScheduleUpdate(SQLModel):
+    """定时计划更新，设置 cron 或 interval 时另一项会被清空"""
+
+    cron: str | None = Field(default=None, max_length=100)
+    interval: int | None = Field(default=None, ge=1)
+    enabled: bool | None = None
+
+
+class JobSchedulePublic(JobScheduleBase):
+    id: int
+    job_id: int
+    last_run_at: datetime | None = None
+    next_run_at: datetime | None = None
+
+    create_at: datetime
+    update_at: datetime
+
+
 class WorkNodeCreate(SQLModel):
     """工作节点创建"""
 
@@ -84,64 +141,160 @@ class WorkNodeCreate(SQLModel):
     status: WorkNode.NodeStatus = WorkNode.NodeStatus.ONLINE
 
 
+class WorkerMetricPoint(SQLModel):
+    """worker 资源使用采样点，降采样时为区间平均值"""
+
+    ts: datetime
+    load1: float | None = None
+    load5: float | None = None
+    load15: float | None = None
+    active: float | None = Field(default=None, description="执行中任务数")
+    processed: float | None = Field(default=None, description="累计处理任务数")
+    processed_rate: float | None = Field(default=None, description="任务处理速率(个/秒)")
+    mem_percent: float | None = Field(default=None, description="主机内存使用率(%)")
+    rss: float | None = Field(default=None, description="worker 进程树常驻内存(字节)")
+
+
+class WorkerMetrics(SQLModel):
+    """worker 资源使用时间序列"""
+
+    node_name: str
+    step: int = Field(description="降采样间隔(秒)，0 为原始心跳点")
+    points: list[WorkerMetricPoint]
+
+
 class Result(SQLModel):
     """任务执行结果"""
 
     stdout: str
     stderr: str
-    return_code: int
+    # 任务返回的键为 returncode
+    return_code: int = Field(validation_alias=AliasChoices("return_code", "returncode"))
     success: bool
+    usage: dict[str, int | float] | None = Field(default=None, description="脚本进程资源使用")
 
 
-class TaskResult(SQLModel):
-    """任务执行结果详情"""
+TaskStatus = Literal["PENDING", "RECEIVED", "STARTED", "SUCCESS", "FAILURE", "RETRY", "REVOKED"]
+
+
+class TaskResultList(SQLModel):
+    """任务执行结果列表"""
 
     task_id: uuid.UUID
 
     create_at: datetime
 
-    @computed_field
-    @property
-    def status(self) -> Literal["PENDING", "STARTED", "SUCCESS", "FAILURE", "RETRY"]:
-        """任务状态"""
-        result = AsyncResult(str(self.task_id))
-        return result.status
+    status: TaskStatus = Field(default="PENDING", description="任务状态")
+    worker: str | None = Field(default=None, description="执行节点")
+    returncode: int | None = Field(default=None, description="脚本退出码")
+    runtime: float | None = Field(default=None, description="执行耗时(秒)")
+    cpu_user: float | None = Field(default=None, description="用户态CPU时间(秒)")
+    cpu_system: float | None = Field(default=None, description="内核态CPU时间(秒)")
+    max_rss: int | None = Field(default=None, description="峰值常驻内存(字节)")
+    wall_time: float | None = Field(default=None, description="脚本进程运行时长(秒)")
+    ctx_switches_voluntary: int | None = Field(default=None, description="主动上下文切换次数")
+    ctx_switches_involuntary: int | None = Field(default=None, description="被动上下文切换次数")
+    start_at: datetime | None = Field(default=None, description="开始执行时间")
+    finish_at: datetime | None = Field(default=None, description="执行结束时间")
+    date_done: datetime | None = Field(default=None, description="任务完成时间")
+
+
+class TaskResult(TaskResultList):
+    """任务执行结果详情"""
+
+    result: Result | None = Field(default=None, description="任务执行结果")
+
+
+class JobRunOut(TaskResultList):
+    """批量运行结果"""
+
+    job_id: int
 
-    @computed_field
-    @property
-    def result(self) -> Result | None:
-        """任务执行结果"""
-        result = AsyncResult(str(self.task_id))
-        return result.result if result.successful() else None
+
+class JobDailyStatsOut(SQLModel):
+    """任务每日运行汇总"""
+
+    day: date
+    total: int
+    success: int
+    failure: int
+    p50_runtime: float | None = None
+    p95_runtime: float | None = None
+    cpu_time: float | None = None
+    max_rss: int | None = None
+    wall_time: float | None = None
 
     @computed_field
     @property
-    def date_done(self) -> datetime | None:
-        """任务完成时间"""
-        result = AsyncResult(str(self.task_id))
-        return result.date_done if result.successful() else None
+    def success_rate(self) -> float | None:
+        return round(self.success / self.total, 4) if self.total else None
 
 
-class TaskResultList(SQLModel):
-    """任务执行结果列表"""
+class JobUsageOut(SQLModel):
+    """任务在统计区间内的资源使用合计"""
+
+    job_id: int
+    name: str
+    runs: int = Field(description="运行次数")
+    cpu_time: float = Field(description="CPU时间合计(秒)")
+    max_rss: int | None = Field(default=None, description="峰值常驻内存(字节)")
+    wall_time: float = Field(description="脚本运行时长合计(秒)")
+
+
+class TeamQuota(SQLModel):
+    """空间运行配额与当前占用"""
+
+    max_concurrent_runs: int = Field(description="并发运行数上限，0 表示不限制")
+    runs_per_minute: int = Field(description="每分钟运行数上限，0 表示不限制")
+    running: int = Field(description="占用并发名额的运行数")
+    queued: int = Field(description="超出配额等待投递的运行数")
 
-    task_id: uuid.UUID
+
+class PipelineBase(SQLModel):
+    name: str = Field(max_length=50)
+    description: str | None = Field(default=None, max_length=100)
+    job_ids: list[int] = Field(min_length=1, description="节点任务ID")
+    edges: list[tuple[int, int]] = Field(default_factory=list, description="依赖关系 [[上游任务ID, 下游任务ID], ...]")
+
+
+class PipelineCreate(PipelineBase):
+    """流水线创建"""
+
+    pass
+
+
+class PipelineUpdate(SQLModel):
+    """流水线更新，节点与依赖关系需一起更新"""
+
+    name: str | None = Field(default=None, max_length=50)
+    description: str | None = Field(default=None, max_length=100)
+    job_ids: list[int] | None = Field(default=None, min_length=1)
+    edges: list[tuple[int, int]] | None = None
+
+
+class PipelinePublic(PipelineBase):
+    id: int
+    team_id: int
+    create_by: int
 
     create_at: datetime
+    update_at: datetime
 
-    @computed_field
-    @property
-    def status(self) -> Literal["PENDING", "STARTED", "SUCCESS", "FAILURE", "RETRY"]:
-        """任务状态"""
-        result = AsyncResult(str(self.task_id))
-        return result.status
 
-    @computed_field
-    @property
-    def date_done(self) -> datetime | None:
-        """任务完成时间"""
-        result = AsyncResult(str(self.task_id))
-        return result.date_done if result.successful() else None
+class PipelineRunOut(SQLModel):
+    """流水线运行，状态由各节点运行记录汇总"""
+
+    id: int
+    pipeline_id: int
+    canvas: str = Field(description="编排方式：series_parallel 按依赖并行，levels 按层级屏障")
+    create_at: datetime
+
+    status: TaskStatus = Field(default="PENDING", description="运行状态")
+    start_at: datetime | None = Field(default=None, description="首个节点开始时间")
+    finish_at: datetime | None = Field(default=None, description="最后一个节点结束时间")
+    wall_time: float | None = Field(default=None, description="端到端耗时(秒)")
+    critical_path: float | None = Field(default=None, description="按节点耗时计算的关键路径(秒)")
+    nodes: list[JobRunOut] = Field(default_factory=list, description="节点运行记录")
 
 
 class TeamMemberBase(SQLModel):
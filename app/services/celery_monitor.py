@@ -1,78 +1,482 @@
+import logging
+import math
 import threading
 import time
+import uuid
+from collections import deque
 from datetime import datetime, timezone
+from functools import lru_cache
 
 from celery.events import EventReceiver
-from celery import Celery
-from kombu import Connection
+from celery import Celery, states
+from celery.utils import worker_direct
+from kombu import Connection, Queue
+from redis.exceptions import RedisError
 
-from app.models.job import WorkNode
+from app.models.job import Job, WorkNode, JobTasks
+from app.core import celeryconfig
+from app.core.config import settings
 from app.core.db import engine
+from app.core.redis import get_redis
+from app.services.job import ORIGIN_QUEUE_HEADER, JobService
+from app.services.metrics import MetricsService
+from app.services.quota import QuotaService
+from app.services.schedule import as_utc
+from app.services.worker_metrics import WorkerMetricsService
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
+logger = logging.getLogger(__name__)
+
 
 # 内存中的 worker 状态缓存
 global_worker_status = {}
+worker_status_lock = threading.Lock()
 
+# 各节点最近一次心跳时间（下线时为 0），用于发现专属队列无人消费的节点；节点下线后仍保留到其专属队列清空
+direct_queue_workers: dict[str, float] = {}
 
-def update_worker_in_db(worker_name, info: dict):
-    """将 worker 信息存储或更新到数据库"""
+# 监控统计（当前进程）
+monitor_stats = {
+    "heartbeat_events": 0,
+    "heartbeat_flushes": 0,
+    "heartbeat_rows_written": 0,
+    "heartbeat_writes_avoided": 0,
+    # worker 脚本缓存命中情况，来自 task-outcome 事件
+    "script_cache_hits": 0,
+    "script_cache_misses": 0,
+    "queued_runs_dispatched": 0,
+    "worker_metric_rows_written": 0,
+    "direct_queue_runs_rerouted": 0,
+}
+
+# 待落库的任务事件，按 task_id 合并
+pending_task_updates: dict[str, dict] = {}
+pending_task_lock = threading.Lock()
+# 缓冲区达到批量上限时提前唤醒落库线程
+flush_wakeup = threading.Event()
+
+# 已结束的任务，由配额线程释放其占用的空间并发名额后投递排队的运行
+finished_task_ids: set[str] = set()
+quota_wakeup = threading.Event()
+
+# 任务投递时间与队列（task-sent 事件），用于计算排队等待时间（进程池伸缩、指标），任务结束时移除
+sent_tasks: dict[str, tuple[float, str]] = {}
+# (开始时间, 队列, 等待秒数)
+task_waits: deque[tuple[float, str, float]] = deque(maxlen=10000)
+task_wait_lock = threading.Lock()
+# 未收到开始事件（如被撤销）的投递记录最多保留的条数
+MAX_SENT_TASKS = 100000
+
+# task-outcome 事件中写入 JobTasks 的资源使用字段
+RUN_USAGE_FIELDS = (
+    "cpu_user",
+    "cpu_system",
+    "max_rss",
+    "wall_time",
+    "ctx_switches_voluntary",
+    "ctx_switches_involuntary",
+)
+
+# 事件类型与任务状态的对应关系
+TASK_EVENT_STATES = {
+    "task-received": states.RECEIVED,
+    "task-started": states.STARTED,
+    "task-succeeded": states.SUCCESS,
+    "task-failed": states.FAILURE,
+    "task-retried": states.RETRY,
+    "task-revoked": states.REVOKED,
+}
+# API 尚未提交 JobTasks 时事件可能先到达，未匹配的更新最多保留的秒数
+UNMATCHED_TASK_UPDATE_TTL = 60
+
+
+def update_workers_in_db(workers: dict[str, dict]):
+    """将一批 worker 信息存储或更新到数据库：一次 IN 查询 + 一次提交"""
+    if not workers:
+        return
+    try:
+        _update_workers_in_db(workers)
+    except IntegrityError:
+        # 其他进程的监控线程已插入同名节点，重试时按更新处理
+        _update_workers_in_db(workers)
+
+
+def _update_workers_in_db(workers: dict[str, dict]):
     with Session(engine) as session:
-        node = session.exec(select(WorkNode).where(WorkNode.node_name == worker_name)).first()
+        nodes = session.exec(select(WorkNode).where(WorkNode.node_name.in_(list(workers)))).all()
+        nodes = {node.node_name: node for node in nodes}
         now = datetime.now(timezone.utc)
-        last_ping = info.get("last_ping")
-        if isinstance(last_ping, (int, float)):
-            last_ping_dt = datetime.fromtimestamp(last_ping, tz=timezone.utc)
-        elif isinstance(last_ping, datetime):
-            last_ping_dt = last_ping
-        else:
-            last_ping_dt = now
-        if not node:
-            node = WorkNode(
-                node_name=worker_name,
-                node_ip=info.get("ip", ""),
-                platform=info.get("platform", ""),
-                status=WorkNode.NodeStatus.ONLINE,
-            )
-            node.last_ping = last_ping_dt
-            node.create_at = now
-            node.update_at = now
+        for worker_name, info in workers.items():
+            node = nodes.get(worker_name)
+            last_ping = info.get("last_ping")
+            if isinstance(last_ping, (int, float)):
+                last_ping_dt = datetime.fromtimestamp(last_ping, tz=timezone.utc)
+            elif isinstance(last_ping, datetime):
+                last_ping_dt = last_ping
+            else:
+                last_ping_dt = now
+            if not node:
+                node = WorkNode(
+                    node_name=worker_name,
+                    node_ip=info.get("ip", ""),
+                    platform=info.get("platform", ""),
+                    status=WorkNode.NodeStatus.ONLINE,
+                )
+                node.last_ping = last_ping_dt
+                node.create_at = now
+                node.update_at = now
+            else:
+                node.status = info.get("status", WorkNode.NodeStatus.ONLINE)
+                node.platform = info.get("platform", node.platform)
+                node.last_ping = last_ping_dt
+                node.update_at = now
             session.add(node)
-        else:
-            node.status = info.get("status", WorkNode.NodeStatus.ONLINE)
-            node.platform = info.get("platform", node.platform)
-            node.last_ping = last_ping_dt
-            node.update_at = now
         session.commit()
 
 
+def update_worker_in_db(worker_name, info: dict):
+    """将 worker 信息存储或更新到数据库"""
+    update_workers_in_db({worker_name: info})
+
+
 def handle_worker_online(event):
     worker = event["hostname"]
     info = {"ip": event.get("ip", ""), "platform": event.get("platform", ""), "last_ping": time.time()}
-    global_worker_status[worker] = info
+    with worker_status_lock:
+        global_worker_status[worker] = info
     update_worker_in_db(worker, info)
 
 
 def handle_worker_heartbeat(event):
+    """心跳只更新内存，由 flush_worker_heartbeats 定期批量落库；负载与任务数记入资源时间序列"""
     worker = event["hostname"]
-    info = global_worker_status.get(worker, {})
-    info["last_ping"] = time.time()
-    # 可扩展：从 event['sw_sys']、event['loadavg']、event['mem']、event['disk'] 获取更多信息
-    global_worker_status[worker] = info
-    update_worker_in_db(worker, info)
+    monitor_stats["heartbeat_events"] += 1
+    WorkerMetricsService.record_heartbeat(event)
+    with worker_status_lock:
+        info = global_worker_status.get(worker)
+        is_new = info is None
+        info = info or {}
+        info["last_ping"] = time.time()
+        # 负载感知投递使用的节点负载；上次心跳后已分配的运行已计入 active，
+        # 分配计数按心跳时间戳分开计数（见 pick_workers），各进程收到同一心跳后使用同一个计数
+        info["active"] = event.get("active") or 0
+        info["load1"] = (event.get("loadavg") or [0])[0]
+        info["heartbeat"] = event.get("timestamp") or 0
+        direct_queue_workers[worker] = info["last_ping"]
+        if not is_new and info.get("dirty"):
+            monitor_stats["heartbeat_writes_avoided"] += 1
+        info["dirty"] = not is_new
+        global_worker_status[worker] = info
+    if is_new:
+        # 监控启动后首次见到该 worker，视为上线，立即写入
+        update_worker_in_db(worker, info)
+
+
+def handle_worker_resources(event):
+    """记录内存使用，并更新节点消费的队列与并发数"""
+    WorkerMetricsService.record_resources(event)
+    with worker_status_lock:
+        info = global_worker_status.get(event["hostname"])
+        if info is not None:
+            info["queues"] = set(event.get("queues") or ())
+            info["concurrency"] = event.get("concurrency") or 1
+            info["cpu_count"] = event.get("cpu_count") or 1
+
+
+# 各 API 进程共享的“上次心跳后已分配”计数：dispatch:assigned:{节点}:{心跳时间戳}
+ASSIGNED_KEY = "dispatch:assigned:{worker}:{heartbeat:.3f}"
+# KEYS: 候选节点本次心跳的已分配计数；ARGV: 待分配数, 计数过期秒数, 再按节点依次为 执行中任务数, 并发数, 每核负载
+# 返回每个运行分配到的节点序号（从 1 开始），0 表示没有空闲节点
+PICK_SCRIPT = """
+local count, ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+local nodes = {}
+for i, key in ipairs(KEYS) do
+  local base = 2 + (i - 1) * 3
+  nodes[i] = {
+    busy = tonumber(ARGV[base + 1]) + (tonumber(redis.call('GET', key)) or 0),
+    concurrency = tonumber(ARGV[base + 2]),
+    load = tonumber(ARGV[base + 3]),
+    added = 0,
+  }
+end
+local picked = {}
+for n = 1, count do
+  local best, best_ratio, best_load = 0, nil, nil
+  for i, node in ipairs(nodes) do
+    if node.busy < node.concurrency then
+      local ratio = node.busy / node.concurrency
+      if best_ratio == nil or ratio < best_ratio or (ratio == best_ratio and node.load < best_load) then
+        best, best_ratio, best_load = i, ratio, node.load
+      end
+    end
+  end
+  picked[n] = best
+  if best > 0 then
+    nodes[best].busy = nodes[best].busy + 1
+    nodes[best].added = nodes[best].added + 1
+  end
+end
+for i, node in ipairs(nodes) do
+  if node.added > 0 then
+    redis.call('INCRBY', KEYS[i], node.added)
+    redis.call('EXPIRE', KEYS[i], ttl)
+  end
+end
+return picked
+"""
+
+
+@lru_cache
+def _pick_script():
+    return get_redis().register_script(PICK_SCRIPT)
+
+
+def pick_workers(queue: str, count: int) -> list[str | None]:
+    """为 count 个运行依次选择消费该队列、有空闲进程且负载最低的节点，没有时为 None
+
+    按 (执行中 + 上次心跳后已分配) / 并发数 比较，相同时比较每核负载。已分配计数保存在 Redis，
+    由 Lua 脚本原子地读取并累加，多个 API 进程同时投递也会分散到不同节点；Redis 不可用时全部投递到共享队列。
+    """
+    stale_before = time.time() - settings.WORKER_STATUS_STALE_SECONDS
+    with worker_status_lock:
+        candidates = [
+            (worker, dict(info))
+            for worker, info in global_worker_status.items()
+            if info.get("last_ping", 0) >= stale_before and queue in info.get("queues", ())
+        ]
+    if not candidates:
+        return [None] * count
+
+    keys, args = [], [count, math.ceil(settings.WORKER_STATUS_STALE_SECONDS * 2)]
+    for worker, info in candidates:
+        keys.append(ASSIGNED_KEY.format(worker=worker, heartbeat=info.get("heartbeat", 0)))
+        args += [info.get("active", 0), info["concurrency"], info.get("load1", 0) / info["cpu_count"]]
+    try:
+        picked = _pick_script()(keys=keys, args=args)
+    except RedisError as e:
+        logger.warning("Pick workers failed, dispatching to shared queue: %s", e)
+        return [None] * count
+    return [candidates[index - 1][0] if index else None for index in picked]
 
 
 def handle_worker_offline(event):
     worker = event["hostname"]
-    info = global_worker_status.get(worker, {})
+    with worker_status_lock:
+        info = global_worker_status.pop(worker, None) or {}
+        if worker in direct_queue_workers:
+            direct_queue_workers[worker] = 0.0
     info["status"] = WorkNode.NodeStatus.OFFLINE
     update_worker_in_db(worker, info)
-    global_worker_status.pop(worker, None)
+
+
+def flush_worker_heartbeats():
+    """将内存中有新心跳的 worker 合并为一次批量写入"""
+    with worker_status_lock:
+        workers = {}
+        for worker, info in global_worker_status.items():
+            if info.get("dirty"):
+                info["dirty"] = False
+                workers[worker] = dict(info)
+    if not workers:
+        return
+    update_workers_in_db(workers)
+    monitor_stats["heartbeat_flushes"] += 1
+    monitor_stats["heartbeat_rows_written"] += len(workers)
+
+
+def _merge_task_update(target: dict, update: dict):
+    """合并同一任务的更新，状态只按 Celery 状态优先级前进"""
+    status = update.pop("status", None)
+    if status and (not target.get("status") or states.state(status) > states.state(target["status"])):
+        target["status"] = status
+    target.update(update)
 
 
 def handle_task_event(event):
-    # 可扩展：记录 worker 正在运行的任务
-    pass
+    """收集任务事件，由 flush_task_updates 批量写入 JobTasks"""
+    task_id = event.get("uuid")
+    if not task_id:
+        return
+    event_type = event["type"]
+    timestamp = datetime.fromtimestamp(event.get("timestamp") or time.time(), tz=timezone.utc)
+
+    update = {}
+    if event_type in TASK_EVENT_STATES:
+        update["status"] = TASK_EVENT_STATES[event_type]
+    if event.get("hostname"):
+        update["worker"] = event["hostname"]
+    if event_type == "task-started":
+        update["start_at"] = timestamp
+    elif event_type in ("task-succeeded", "task-failed", "task-revoked"):
+        update["finish_at"] = timestamp
+        if event.get("runtime") is not None:
+            update["runtime"] = event["runtime"]
+        with pending_task_lock:
+            finished_task_ids.add(task_id)
+        quota_wakeup.set()
+    elif event_type == "task-outcome":
+        update["returncode"] = event.get("returncode")
+        # 脚本进程的资源使用（见 app.tasks.forkserver.rusage_dict），未能启动时为空
+        usage = event.get("usage") or {}
+        update.update({field: usage[field] for field in RUN_USAGE_FIELDS if usage.get(field) is not None})
+        if event.get("script_cache") == "hit":
+            monitor_stats["script_cache_hits"] += 1
+        elif event.get("script_cache") == "miss":
+            monitor_stats["script_cache_misses"] += 1
+
+    with pending_task_lock:
+        pending = pending_task_updates.setdefault(task_id, {"first_seen": time.time()})
+        _merge_task_update(pending, update)
+        if len(pending_task_updates) >= settings.CELERY_MONITOR_BATCH_SIZE:
+            flush_wakeup.set()
+
+
+def handle_task_sent(event):
+    with task_wait_lock:
+        sent_tasks[event["uuid"]] = (event.get("timestamp") or time.time(), event.get("queue") or "")
+        if len(sent_tasks) > MAX_SENT_TASKS:
+            sent_tasks.pop(next(iter(sent_tasks)))
+
+
+def record_task_timing(event):
+    """按投递时间计算等待时间，并记录任务指标"""
+    event_type = event["type"]
+    with task_wait_lock:
+        if event_type in ("task-succeeded", "task-failed", "task-revoked"):
+            sent = sent_tasks.pop(event.get("uuid"), None)
+        else:
+            sent = sent_tasks.get(event.get("uuid"))
+        if sent and event_type == "task-started":
+            started_at = event.get("timestamp") or time.time()
+            task_waits.append((started_at, sent[1], max(started_at - sent[0], 0.0)))
+    MetricsService.observe_task_event(event, sent)
+
+
+def recent_task_waits(queues: list[str], window: float) -> list[float]:
+    """最近 window 秒内开始执行的、投递到指定队列的任务的等待时间"""
+    since = time.time() - window
+    queues = set(queues)
+    with task_wait_lock:
+        return [wait for started_at, queue, wait in task_waits if started_at >= since and queue in queues]
+
+
+def flush_task_updates():
+    """将缓冲的任务事件批量写入数据库：一次 IN 查询 + 一次提交"""
+    with pending_task_lock:
+        updates = dict(pending_task_updates)
+        pending_task_updates.clear()
+    if not updates:
+        return
+
+    with Session(engine) as session:
+        task_ids = [uuid.UUID(task_id) for task_id in updates]
+        job_tasks = session.exec(select(JobTasks).where(JobTasks.task_id.in_(task_ids))).all()
+        finished = []
+        for job_task in job_tasks:
+            update = dict(updates.pop(str(job_task.task_id)))
+            update.pop("first_seen", None)
+            status = update.pop("status", None)
+            is_finished = status in states.READY_STATES and job_task.status not in states.READY_STATES
+            if status and states.state(status) >= states.state(job_task.status):
+                job_task.status = status
+            for field, value in update.items():
+                setattr(job_task, field, value)
+            if is_finished and job_task.finish_at and job_task.create_at:
+                # 提交后属性过期，提前取出
+                finished.append((job_task.job_id, job_task.create_at, job_task.finish_at))
+            session.add(job_task)
+        session.commit()
+        if finished and MetricsService.is_leader:
+            observe_end_to_end(session, finished)
+
+    # 未匹配到记录的事件留待下一批，超时后丢弃
+    now = time.time()
+    with pending_task_lock:
+        for task_id, update in updates.items():
+            if now - update["first_seen"] > UNMATCHED_TASK_UPDATE_TTL:
+                continue
+            newer = pending_task_updates.pop(task_id, None)
+            pending_task_updates[task_id] = update
+            if newer:
+                newer.pop("first_seen")
+                _merge_task_update(update, newer)
+
+
+def observe_end_to_end(session: Session, finished: list[tuple[int, datetime, datetime]]):
+    """记录运行从创建到结束的耗时，按空间、任务区分"""
+    job_ids = {job_id for job_id, _, _ in finished}
+    teams = dict(session.exec(select(Job.id, Job.team_id).where(Job.id.in_(job_ids))).all())
+    for job_id, create_at, finish_at in finished:
+        seconds = (as_utc(finish_at) - as_utc(create_at)).total_seconds()
+        MetricsService.observe_end_to_end(teams.get(job_id), job_id, seconds)
+
+
+def dispatch_queued_runs():
+    """释放已结束任务的并发名额，并按空间轮转投递排队的运行"""
+    with pending_task_lock:
+        task_ids = list(finished_task_ids)
+        finished_task_ids.clear()
+    # 释放失败时名额在 QUOTA_SLOT_TTL 后自动回收
+    QuotaService.release(task_ids)
+    with Session(engine) as session:
+        monitor_stats["queued_runs_dispatched"] += JobService.dispatch_queued(
+            session, settings.QUOTA_DRAIN_BATCH_SIZE
+        )
+
+
+def drain_direct_queue(connection: Connection, worker: str) -> int:
+    """将节点专属队列中未消费的运行按消息头记录的原队列改投回共享队列，返回改投条数"""
+    queue = worker_direct(worker).name
+    channel = connection.default_channel
+    producer = connection.Producer(channel)
+    moved = 0
+    while True:
+        message = channel.basic_get(queue, no_ack=False)
+        if message is None:
+            return moved
+        origin = message.headers.get(ORIGIN_QUEUE_HEADER) or celeryconfig.task_default_queue
+        properties = message.properties
+        # 消息体已序列化，原样发送
+        producer.publish(
+            message.body,
+            routing_key=origin,
+            exchange="",
+            headers=message.headers,
+            content_type=message.content_type,
+            content_encoding=message.content_encoding,
+            priority=properties.get("priority"),
+            correlation_id=properties.get("correlation_id"),
+            reply_to=properties.get("reply_to"),
+            declare=[Queue(origin)],
+        )
+        message.ack()
+        moved += 1
+
+
+def reroute_orphaned_runs(celery_app: Celery):
+    """节点下线或长时间没有心跳时改投其专属队列中的运行；各进程的监控线程都会检查，通过 Redis 锁只由一个进程改投"""
+    if settings.DISPATCH_MODE != "least_loaded":
+        return
+    orphaned_before = time.time() - settings.DIRECT_QUEUE_ORPHAN_SECONDS
+    with worker_status_lock:
+        workers = [worker for worker, last_ping in direct_queue_workers.items() if last_ping < orphaned_before]
+    for worker in workers:
+        try:
+            if not get_redis().set(f"dispatch:drain:{worker}", 1, nx=True, ex=60):
+                continue
+        except RedisError as e:
+            logger.warning("Skip draining direct queue of %s: %s", worker, e)
+            return
+        with celery_app.connection_for_write() as connection:
+            moved = drain_direct_queue(connection, worker)
+        if moved:
+            logger.warning("Rerouted %d runs from direct queue of unreachable worker %s", moved, worker)
+            monitor_stats["direct_queue_runs_rerouted"] += moved
+        with worker_status_lock:
+            # 期间恢复心跳的节点继续跟踪
+            if direct_queue_workers.get(worker, 0.0) < orphaned_before:
+                direct_queue_workers.pop(worker, None)
 
 
 def event_handler(event):
@@ -83,7 +487,13 @@ def event_handler(event):
         handle_worker_heartbeat(event)
     elif type == "worker-offline":
         handle_worker_offline(event)
+    elif type == "worker-resources":
+        handle_worker_resources(event)
+    elif type == "task-sent":
+        # 投递方发出，hostname 不是 worker
+        handle_task_sent(event)
     elif type.startswith("task-"):
+        record_task_timing(event)
         handle_task_event(event)
 
 
@@ -93,8 +503,46 @@ def start_celery_monitor(celery_app: Celery):
             recv = EventReceiver(conn, handlers={"*": event_handler}, app=celery_app)
             recv.capture(limit=None, timeout=None, wakeup=True)
 
+    def _flush():
+        last_heartbeat_flush = time.monotonic()
+        while True:
+            flush_wakeup.wait(settings.CELERY_MONITOR_FLUSH_INTERVAL)
+            flush_wakeup.clear()
+            MetricsService.renew_leadership()
+            try:
+                flush_task_updates()
+            except Exception:
+                logger.exception("Flush task events failed")
+            if time.monotonic() - last_heartbeat_flush >= settings.WORKER_HEARTBEAT_FLUSH_INTERVAL:
+                last_heartbeat_flush = time.monotonic()
+                try:
+                    flush_worker_heartbeats()
+                except Exception:
+                    logger.exception("Flush worker heartbeats failed")
+            if settings.WORKER_METRICS_PERSIST_INTERVAL > 0:
+                try:
+                    monitor_stats["worker_metric_rows_written"] += WorkerMetricsService.persist()
+                except Exception:
+                    logger.exception("Persist worker metrics failed")
+            try:
+                reroute_orphaned_runs(celery_app)
+            except Exception:
+                logger.exception("Reroute orphaned runs failed")
+
+    def _dispatch_queued():
+        # 任务结束时立即唤醒；令牌桶按时间补充，因此也定期检查
+        while True:
+            quota_wakeup.wait(1.0)
+            quota_wakeup.clear()
+            try:
+                dispatch_queued_runs()
+            except Exception:
+                logger.exception("Dispatch queued runs failed")
+
     t = threading.Thread(target=_run, daemon=True)
     t.start()
+    threading.Thread(target=_flush, daemon=True).start()
+    threading.Thread(target=_dispatch_queued, daemon=True).start()
 
 
 # 在 celery 启动时调用 start_celery_monitor()
@@ -1,7 +1,35 @@
+import re
+import uuid
+from datetime import datetime, timezone
+
+from celery.canvas import Signature
+from celery.utils import worker_direct
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
+from app.core.config import settings
 from app.models.job import Job, Team, WorkNode
 from app.schemas.job import JobCreate, TeamCreate, WorkNodeCreate
+from app.services.metrics import DISPATCH_SECONDS, DISPATCHED_RUNS
+from app.services.quota import QuotaService
+from app.tasks.script_cache import script_hash
+
+
+# 负载感知投递时消息头中记录的原共享队列
+ORIGIN_QUEUE_HEADER = "origin_queue"
+
+
+class PublishError(Exception):
+    """任务消息发送失败，published 为失败前已发送的条数
+
+    dispatch_jobs 抛出时 sent_rows 为已发送运行的 JobTasks 行，按其在 jobs 中的位置索引，由调用方决定是否写入。
+    """
+
+    def __init__(self, published: int):
+        super().__init__(f"Publish failed after {published} messages")
+        self.published = published
+        self.sent_rows: dict[int, dict] = {}
 
 
 class JobService:
@@ -21,11 +49,18 @@ class JobService:
     @classmethod
     def create_job(cls, db: Session, job_create: JobCreate, team_id: int, user_id: int) -> Job:
         """创建任务"""
-        job = db.exec(select(Job).where(Job.name == job_create.name, Job.team_id == team_id)).first()
+        statement = select(Job).where(Job.name == job_create.name, Job.team_id == team_id)
+        job = db.exec(statement).first()
         if not job:
             job = Job.model_validate(job_create, update={"team_id": team_id, "owner_id": user_id})
+            cls.set_script_hash(job)
             db.add(job)
-            db.commit()
+            try:
+                db.commit()
+            except IntegrityError:
+                # 并发创建同名任务，返回已存在的任务
+                db.rollback()
+                return db.exec(statement).one()
             db.refresh(job)
         return job
 
@@ -33,11 +68,153 @@ class JobService:
     def update_job(cls, db: Session, job: Job, job_update: JobCreate) -> Job:
         """更新任务"""
         job.sqlmodel_update(job, update=job_update.model_dump(exclude_unset=True))
+        cls.set_script_hash(job)
         db.add(job)
         db.commit()
         db.refresh(job)
         return job
 
+    @classmethod
+    def set_script_hash(cls, job: Job):
+        """记录脚本哈希；脚本内容由调用方通过 ScriptStore.put 保存（worker 在 Redis 未命中时回退到数据库）"""
+        job.script_hash = script_hash(job.script_content) if job.script_content else None
+
+    @classmethod
+    def job_signature(cls, job: Job, task_id: str | None = None):
+        """构造任务的 Celery 签名"""
+        # 延迟导入：app.celery 启动监控时会导入 services，避免循环导入
+        from app.tasks.task import execute_script_content
+
+        script_type = cls.script_type(job)
+        if job.script_hash:
+            # 消息只携带脚本哈希，worker 按需读取脚本内容
+            args, kwargs = (None, script_type, {"timeout": 10}), {"script_hash": job.script_hash}
+        else:
+            args, kwargs = (job.script_content, script_type, {"timeout": 10}), {}
+        return execute_script_content.signature(
+            args,
+            kwargs,
+            ignore_result=job.ignore_result,
+            task_id=task_id or str(uuid.uuid4()),
+            queue=cls.job_queue(job),
+        )
+
+    @classmethod
+    def job_language(cls, job: Job) -> str:
+        """规范化的语言名，需预先加载 job.language"""
+        return cls.normalize_language(job.language.language)
+
+    @classmethod
+    def normalize_language(cls, language: str) -> str:
+        return re.sub(r"[^a-z0-9]+", "_", language.lower()).strip("_")
+
+    @classmethod
+    def script_type(cls, job: Job) -> str:
+        """执行脚本的解释器类型，不支持的语言按 python 执行"""
+        from app.tasks.task import ALLOWED_TYPES
+
+        language = cls.job_language(job)
+        return language if language in ALLOWED_TYPES else "python"
+
+    @classmethod
+    def job_queue(cls, job: Job) -> str:
+        """按脚本类型和优先级路由：jobs.{script_type}.{priority}，语言名由用户自定义，不直接用于队列名"""
+        return f"jobs.{cls.script_type(job)}.{Job.Priority(job.priority).value}"
+
+    @classmethod
+    def job_queues(cls) -> list[str]:
+        """全部脚本类型、优先级的脚本队列，与 scripts/start_celery.sh 默认消费的队列一致"""
+        from app.tasks.task import ALLOWED_TYPES
+
+        return [
+            f"jobs.{script_type}.{priority.value}" for script_type in sorted(ALLOWED_TYPES) for priority in Job.Priority
+        ]
+
+    @classmethod
+    def route_to_workers(cls, signatures: list[Signature]):
+        """负载感知投递：改投到负载最低节点的专属队列，没有可用节点时保留共享队列"""
+        if settings.DISPATCH_MODE != "least_loaded":
+            return
+        # 延迟导入：celery_monitor 导入了本模块
+        from app.services.celery_monitor import pick_workers
+
+        by_queue: dict[str, list[Signature]] = {}
+        for signature in signatures:
+            by_queue.setdefault(signature.options["queue"], []).append(signature)
+        for queue, queued in by_queue.items():
+            for signature, worker in zip(queued, pick_workers(queue, len(queued))):
+                if worker:
+                    # 记录原队列，节点失联时由监控线程改投回共享队列（见 celery_monitor.drain_direct_queue）
+                    signature.set(queue=worker_direct(worker), headers={ORIGIN_QUEUE_HEADER: queue})
+
+    @classmethod
+    def publish(cls, signatures: list[Signature]) -> int:
+        """逐条发送（共用一个 producer 连接），返回发送数；发送失败时抛出 PublishError，带已发送数"""
+        published = 0
+        try:
+            with signatures[0].app.producer_or_acquire() as producer:
+                for signature in signatures:
+                    signature.apply_async(producer=producer)
+                    published += 1
+        except Exception as e:
+            raise PublishError(published) from e
+        finally:
+            DISPATCHED_RUNS.labels("published").inc(published)
+        return published
+
+    @classmethod
+    def dispatch_jobs(cls, team: Team, jobs: list[Job]) -> list[dict]:
+        """按空间配额投递任务，返回待写入的 JobTasks 行
+
+        超出配额的运行进入空间排队队列，由监控线程在名额释放后投递；可立即投递的逐条发送（共用一个 producer 连接）。
+        发送失败时释放本批未发送运行的名额、移除本批排队的运行后抛出 PublishError，调用方不写入运行记录。
+        """
+        with DISPATCH_SECONDS.time():
+            task_ids = [str(uuid.uuid4()) for _ in jobs]
+            runs = [(task_id, job.id) for task_id, job in zip(task_ids, jobs)]
+            admitted = QuotaService.admit(team, runs)
+            signatures = [
+                cls.job_signature(job, task_id) for job, task_id, ok in zip(jobs, task_ids, admitted) if ok
+            ]
+            create_at = datetime.now(timezone.utc)
+            rows = [
+                {"job_id": job.id, "task_id": uuid.UUID(task_id), "status": "PENDING", "create_at": create_at}
+                for job, task_id in zip(jobs, task_ids)
+            ]
+            if signatures:
+                cls.route_to_workers(signatures)
+                try:
+                    cls.publish(signatures)
+                except PublishError as e:
+                    sent = {signature.id for signature in signatures[: e.published]}
+                    QuotaService.discard(team, [run for run in runs if run[0] not in sent])
+                    e.sent_rows = {index: row for index, row in enumerate(rows) if str(row["task_id"]) in sent}
+                    raise
+        DISPATCHED_RUNS.labels("queued").inc(len(jobs) - len(signatures))
+        return rows
+
+    @classmethod
+    def dispatch_queued(cls, db: Session, limit: int) -> int:
+        """投递已获得配额的排队运行，返回投递数量"""
+        runs = QuotaService.next_runs(db, limit)
+        if not runs:
+            return 0
+        statement = select(Job).where(Job.id.in_({job_id for _, job_id in runs})).options(selectinload(Job.language))
+        jobs = {job.id: job for job in db.exec(statement).all()}
+        # 排队期间任务被删除的运行直接释放名额
+        QuotaService.release([task_id for task_id, job_id in runs if job_id not in jobs])
+        runs = [(task_id, job_id) for task_id, job_id in runs if job_id in jobs]
+        if not runs:
+            return 0
+        signatures = [cls.job_signature(jobs[job_id], task_id) for task_id, job_id in runs]
+        cls.route_to_workers(signatures)
+        try:
+            return cls.publish(signatures)
+        except PublishError as e:
+            # 只把未发送的运行放回排队队列，已发送的不会重复投递
+            QuotaService.requeue([(task_id, job_id, jobs[job_id].team_id) for task_id, job_id in runs[e.published:]])
+            raise
+
 
 class WorkNodeService:
     """工作节点管理"""
@@ -1,7 +1,8 @@
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.models import User
-from app.core.security import verify_password
+from app.core.security import password_pool, verify_password
 
 
 def get_user_by_email(*, session: Session, email: str) -> User | None:
@@ -23,3 +24,18 @@ def authenticate(*, session: Session, username: str, password: str) -> User | No
     if not verify_password(password, db_user.hashed_password):
         return None
     return db_user
+
+
+async def authenticate_async(*, session: AsyncSession, username: str, password: str) -> User | None:
+    """在密码校验进程池中校验，bcrypt 参数变化时顺带更新哈希"""
+    db_user = (await session.exec(select(User).where(User.username == username))).first()
+    if not db_user:
+        return None
+    verified, new_hash = await password_pool.verify_and_update(password, db_user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        db_user.hashed_password = new_hash
+        session.add(db_user)
+        await session.commit()
+    return db_user
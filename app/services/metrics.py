@@ -0,0 +1,169 @@
+"""Prometheus 指标
+
+- API 侧耗时（HTTP 请求、投递）由处理请求的进程记录
+- 任务事件每个导入 app.celery 的进程都会收到，只由持有 Redis 锁的一个 API 进程记录，避免重复计数
+- 队列积压在抓取时从 broker 读取
+
+多 worker 部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（启动前清空），各进程的指标写入该目录，
+/metrics 汇总全部进程；未设置时只输出当前进程的指标。
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+
+from celery.utils import worker_direct
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from redis.exceptions import RedisError
+
+from app.core import celeryconfig
+from app.core.config import settings
+from app.core.redis import get_broker_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+DISPATCH_SECONDS = Histogram("task_dispatch_seconds", "Time to admit and publish a batch of runs")
+DISPATCHED_RUNS = Counter("task_dispatched_runs", "Runs published to the broker or queued by quota", ["result"])
+QUEUE_WAIT_SECONDS = Histogram(
+    "task_queue_wait_seconds", "Time from publish to worker receipt", ["queue"], buckets=LATENCY_BUCKETS
+)
+RUNTIME_SECONDS = Histogram("task_runtime_seconds", "Task execution time", ["queue"], buckets=LATENCY_BUCKETS)
+# 按任务区分，标签数随任务数增长，桶数较少
+END_TO_END_SECONDS = Histogram(
+    "task_end_to_end_seconds",
+    "Time from run creation to finish",
+    ["team", "job"],
+    buckets=(1, 5, 15, 60, 300, 1800, 3600),
+)
+TASK_RESULTS = Counter("task_results", "Finished and retried tasks by state", ["state"])
+OUTPUT_BYTES = Histogram(
+    "task_output_bytes", "Script stdout + stderr size", buckets=(0, 1024, 16384, 131072, 1048576, 4194304)
+)
+
+LEADER_KEY = "metrics:event-leader"
+# 只有持有者才能续约
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+# kombu Redis 传输中，消息带优先级时按档位存入 {队列}\x06\x16{档位} 列表
+PRIORITY_KEY_SUFFIXES = ("", "\x06\x163", "\x06\x166", "\x06\x169")
+QUEUE_DEPTH_CACHE_SECONDS = 5
+
+
+class QueueDepthCollector:
+    """抓取时读取 broker 中各队列的消息数，短时间内的重复抓取使用缓存"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cached_at = 0.0
+        self.depths: dict[str, int] = {}
+
+    def queues(self) -> list[str]:
+        """默认队列、各脚本类型与优先级的脚本队列、已知 worker 的专属队列"""
+        # 延迟导入：job 与 celery_monitor 都导入了本模块
+        from app.services.celery_monitor import global_worker_status, worker_status_lock
+        from app.services.job import JobService
+
+        queues = [celeryconfig.task_default_queue, *JobService.job_queues()]
+        with worker_status_lock:
+            queues += [worker_direct(worker).name for worker in global_worker_status]
+        return queues
+
+    def read_depths(self) -> dict[str, int]:
+        queues = self.queues()
+        pipeline = get_broker_redis().pipeline(transaction=False)
+        for queue in queues:
+            for suffix in PRIORITY_KEY_SUFFIXES:
+                pipeline.llen(queue + suffix)
+        lengths = iter(pipeline.execute())
+        return {queue: sum(next(lengths) for _ in PRIORITY_KEY_SUFFIXES) for queue in queues}
+
+    def collect(self):
+        with self.lock:
+            if time.monotonic() - self.cached_at >= QUEUE_DEPTH_CACHE_SECONDS:
+                try:
+                    self.depths = self.read_depths()
+                except RedisError as e:
+                    logger.warning("Read queue depth failed: %s", e)
+                self.cached_at = time.monotonic()
+            depths = dict(self.depths)
+        gauge = GaugeMetricFamily("task_queue_depth", "Messages waiting in the broker", labels=["queue"])
+        for queue, depth in sorted(depths.items()):
+            gauge.add_metric([queue], depth)
+        yield gauge
+
+
+class MetricsService:
+    """指标记录与输出"""
+
+    # 只有提供 /metrics 的 API 进程参与任务事件记录
+    enabled = False
+    is_leader = False
+    token = uuid.uuid4().hex
+    next_renew = 0.0
+    queue_depth = QueueDepthCollector()
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = settings.METRICS_ENABLED
+
+    @classmethod
+    def renew_leadership(cls):
+        """由监控线程定期调用，获取或续约任务事件记录锁"""
+        if not cls.enabled or time.monotonic() < cls.next_renew:
+            return
+        ttl = settings.METRICS_LEADER_TTL * 1000
+        cls.next_renew = time.monotonic() + settings.METRICS_LEADER_TTL / 3
+        try:
+            redis = get_redis()
+            if cls.is_leader:
+                cls.is_leader = bool(redis.eval(RENEW_SCRIPT, 1, LEADER_KEY, cls.token, ttl))
+            else:
+                cls.is_leader = bool(redis.set(LEADER_KEY, cls.token, nx=True, px=ttl))
+        except RedisError as e:
+            logger.warning("Renew metrics leadership failed: %s", e)
+            cls.is_leader = False
+
+    @classmethod
+    def observe_task_event(cls, event: dict, sent: tuple[float, str] | None):
+        """sent 为任务的投递时间与队列（来自 task-sent 事件）"""
+        if not cls.is_leader:
+            return
+        event_type = event["type"]
+        queue = sent[1] if sent else ""
+        if event_type == "task-received" and sent:
+            QUEUE_WAIT_SECONDS.labels(queue).observe(max((event.get("timestamp") or time.time()) - sent[0], 0.0))
+        elif event_type == "task-succeeded":
+            TASK_RESULTS.labels("succeeded").inc()
+            if event.get("runtime") is not None:
+                RUNTIME_SECONDS.labels(queue).observe(event["runtime"])
+        elif event_type in ("task-failed", "task-retried", "task-revoked"):
+            TASK_RESULTS.labels(event_type.removeprefix("task-")).inc()
+        elif event_type == "task-outcome" and event.get("output_bytes") is not None:
+            OUTPUT_BYTES.observe(event["output_bytes"])
+
+    @classmethod
+    def observe_end_to_end(cls, team_id: int | None, job_id: int, seconds: float):
+        if cls.is_leader:
+            END_TO_END_SECONDS.labels(str(team_id or ""), str(job_id)).observe(max(seconds, 0.0))
+
+    @classmethod
+    def latest(cls) -> bytes:
+        registry = CollectorRegistry()
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry.register(REGISTRY)
+        registry.register(cls.queue_depth)
+        return generate_latest(registry)
@@ -0,0 +1,195 @@
+"""流水线：将任务组成的 DAG 编排为 Celery canvas
+
+串并联图按结构递归分解：弱连通分量之间并行（group），分量内部按串行切分点顺序执行（chain，
+其中 group 后接节点即为 chord），每个节点在其全部上游完成后立即开始，总耗时等于关键路径。
+无法分解的部分（如 a→c、b→c、b→d）退化为按层级屏障执行，结果仍正确但可能多等待。
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from celery import chain, group, states
+from celery.canvas import Signature
+
+from app.models.job import Job, JobTasks, Pipeline
+from app.services.job import JobService
+
+
+def topological_order(job_ids: list[int], edges: list[list[int]]) -> list[int]:
+    """按依赖关系排序节点，存在环或边引用了不在流水线中的任务时抛出 ValueError"""
+    nodes = list(dict.fromkeys(job_ids))
+    indegree = {node: 0 for node in nodes}
+    children = defaultdict(list)
+    for upstream, downstream in edges:
+        if upstream not in indegree or downstream not in indegree:
+            raise ValueError(f"Edge {upstream}->{downstream} references a job outside the pipeline")
+        if upstream == downstream:
+            raise ValueError(f"Job {upstream} cannot depend on itself")
+        children[upstream].append(downstream)
+        indegree[downstream] += 1
+
+    order = [node for node in nodes if indegree[node] == 0]
+    for node in order:
+        for child in children[node]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                order.append(child)
+    if len(order) != len(nodes):
+        raise ValueError("Pipeline contains a cycle")
+    return order
+
+
+class CanvasBuilder:
+    """将 DAG 分解为 chain / group 嵌套的 canvas"""
+
+    def __init__(self, job_ids: list[int], edges: list[list[int]]):
+        self.order = topological_order(job_ids, edges)
+        self.parents = defaultdict(set)
+        self.neighbors = defaultdict(set)
+        for upstream, downstream in edges:
+            self.parents[downstream].add(upstream)
+            self.neighbors[upstream].add(downstream)
+            self.neighbors[downstream].add(upstream)
+        self.ancestors: dict[int, set[int]] = {}
+        for node in self.order:
+            ancestors = set(self.parents[node])
+            for parent in self.parents[node]:
+                ancestors |= self.ancestors[parent]
+            self.ancestors[node] = ancestors
+        # 是否完全按串并联结构分解（未退化为层级屏障）
+        self.exact = True
+
+    def build(self, signatures: dict[int, Signature]):
+        self.signatures = signatures
+        return self._build(self.order)
+
+    def _build(self, nodes: list[int]):
+        """nodes 为拓扑序，且是原图中的凸子集（任意两节点间的路径都在子集内）"""
+        if len(nodes) == 1:
+            return self.signatures[nodes[0]]
+
+        components = self._components(nodes)
+        if len(components) > 1:
+            return group([self._build(component) for component in components])
+
+        # 串行切分点：前缀中的每个节点都是后缀中每个节点的上游，因而在任意拓扑序中都位于后缀之前
+        for k in range(1, len(nodes)):
+            prefix = set(nodes[:k])
+            if all(prefix <= self.ancestors[node] for node in nodes[k:]):
+                return chain(self._build(nodes[:k]), self._build(nodes[k:]))
+
+        self.exact = False
+        return self._build_levels(nodes)
+
+    def _components(self, nodes: list[int]) -> list[list[int]]:
+        """子集内的弱连通分量，各分量保持拓扑序"""
+        members = set(nodes)
+        component_of = {}
+        for start in nodes:
+            if start in component_of:
+                continue
+            component_of[start] = start
+            stack = [start]
+            while stack:
+                node = stack.pop()
+                for neighbor in self.neighbors[node] & members:
+                    if neighbor not in component_of:
+                        component_of[neighbor] = start
+                        stack.append(neighbor)
+        components = defaultdict(list)
+        for node in nodes:
+            components[component_of[node]].append(node)
+        return list(components.values())
+
+    def _build_levels(self, nodes: list[int]):
+        """按最长路径分层，层与层之间设屏障"""
+        members = set(nodes)
+        level = {}
+        for node in nodes:
+            level[node] = max((level[parent] + 1 for parent in self.parents[node] & members), default=0)
+        levels = defaultdict(list)
+        for node in nodes:
+            levels[level[node]].append(node)
+        steps = []
+        for i in sorted(levels):
+            signatures = [self.signatures[node] for node in levels[i]]
+            steps.append(group(signatures) if len(signatures) > 1 else signatures[0])
+        return chain(steps)
+
+
+class PipelineService:
+    """流水线管理"""
+
+    @classmethod
+    def validate(cls, job_ids: list[int], edges: list[list[int]]):
+        topological_order(job_ids, edges)
+
+    @classmethod
+    def node_signature(cls, job: Job, task_id: str) -> Signature:
+        """节点签名：不接收上游结果；脚本失败时任务失败，下游不再执行；chord 依赖结果后端计数"""
+        signature = JobService.job_signature(job, task_id)
+        signature.kwargs["fail_on_error"] = True
+        return signature.set(immutable=True, ignore_result=False)
+
+    @classmethod
+    def dispatch(cls, pipeline: Pipeline, jobs: list[Job]) -> tuple[str, list[dict]]:
+        """投递一次流水线运行，返回编排方式与待写入的 JobTasks 行（不含 pipeline_run_id）
+
+        流水线作为整体投递，不经过空间配额排队。
+        """
+        jobs = {job.id: job for job in jobs}
+        task_ids = {job_id: str(uuid.uuid4()) for job_id in pipeline.job_ids}
+        builder = CanvasBuilder(pipeline.job_ids, pipeline.edges)
+        canvas = builder.build({job_id: cls.node_signature(jobs[job_id], task_ids[job_id]) for job_id in task_ids})
+        canvas.apply_async()
+
+        create_at = datetime.now(timezone.utc)
+        rows = [
+            {"job_id": job_id, "task_id": uuid.UUID(task_id), "status": states.PENDING, "create_at": create_at}
+            for job_id, task_id in task_ids.items()
+        ]
+        return ("series_parallel" if builder.exact else "levels"), rows
+
+    @classmethod
+    def run_summary(cls, pipeline: Pipeline, job_tasks: list[JobTasks]) -> dict:
+        """由节点运行记录汇总流水线运行状态
+
+        任一节点失败即为失败（下游节点不会执行，保持 PENDING），全部成功为成功。
+        critical_path 为按各节点实际耗时计算的最长依赖链，可与 wall_time 对比编排开销。
+        """
+        statuses = [job_task.status for job_task in job_tasks]
+        if any(status in (states.FAILURE, states.REVOKED) for status in statuses):
+            status = states.FAILURE
+        elif statuses and all(status == states.SUCCESS for status in statuses):
+            status = states.SUCCESS
+        elif all(status == states.PENDING for status in statuses):
+            status = states.PENDING
+        else:
+            status = states.STARTED
+
+        start_at = min((job_task.start_at for job_task in job_tasks if job_task.start_at), default=None)
+        finish_at = None
+        wall_time = critical_path = None
+        if status in states.READY_STATES:
+            finish_at = max((job_task.finish_at for job_task in job_tasks if job_task.finish_at), default=None)
+        if status == states.SUCCESS:
+            if start_at and finish_at:
+                wall_time = (finish_at - start_at).total_seconds()
+            runtimes = {job_task.job_id: job_task.runtime or 0 for job_task in job_tasks}
+            parents = defaultdict(list)
+            for upstream, downstream in pipeline.edges:
+                parents[downstream].append(upstream)
+            finish = {}
+            for job_id in topological_order(pipeline.job_ids, pipeline.edges):
+                start = max((finish[parent] for parent in parents[job_id]), default=0)
+                finish[job_id] = start + runtimes.get(job_id, 0)
+            critical_path = max(finish.values(), default=0)
+
+        return {
+            "status": status,
+            "start_at": start_at,
+            "finish_at": finish_at,
+            "wall_time": wall_time,
+            "critical_path": critical_path,
+        }
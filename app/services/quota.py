@@ -0,0 +1,228 @@
+"""空间运行配额：并发运行数 + 每分钟运行数（令牌桶）
+
+计数保存在 Redis，检查与占用由 Lua 脚本原子完成，多个 API 进程同时投递也不会超额：
+- quota:{team_id}:running  占用并发名额的 task_id 有序集合，分值为名额到期时间，完成事件丢失时到期回收
+- quota:{team_id}:bucket   令牌桶（tokens, ts），容量与每分钟补充量均为 runs_per_minute
+- quota:{team_id}:pending  超出配额的运行（task_id:job_id），先进先出
+- quota:queued-teams       有排队运行的空间，监控线程按空间轮转投递
+- quota:slot:{task_id}     运行所占名额所在的集合，任务结束时据此释放
+"""
+
+import logging
+import random
+import time
+from functools import lru_cache
+
+from redis.exceptions import RedisError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models.job import Team
+
+logger = logging.getLogger(__name__)
+
+RUNNING_KEY = "quota:{team_id}:running"
+BUCKET_KEY = "quota:{team_id}:bucket"
+PENDING_KEY = "quota:{team_id}:pending"
+QUEUED_TEAMS_KEY = "quota:queued-teams"
+SLOT_KEY_PREFIX = "quota:slot:"
+
+# KEYS: running, bucket, pending, queued-teams
+# ARGV: now, team_id, max_running, runs_per_minute, slot_ttl, slot_key_prefix, task_id, entry
+# 传入 task_id 时尝试立即占用，失败则排队，返回 1/0；task_id 为空时从排队队列取出下一条，返回 entry 或 nil
+ADMIT_SCRIPT = """
+local running, bucket, pending, queued_teams = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local now, team_id = tonumber(ARGV[1]), ARGV[2]
+local max_running, rate, slot_ttl = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+
+local function take()
+  redis.call('ZREMRANGEBYSCORE', running, '-inf', now)
+  if max_running > 0 and redis.call('ZCARD', running) >= max_running then
+    return false
+  end
+  if rate > 0 then
+    local state = redis.call('HMGET', bucket, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or rate
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(rate, tokens + math.max(now - ts, 0) * rate / 60)
+    if tokens < 1 then
+      return false
+    end
+    redis.call('HSET', bucket, 'tokens', tostring(tokens - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', bucket, 60)
+  end
+  return true
+end
+
+local function occupy(task_id)
+  redis.call('ZADD', running, now + slot_ttl, task_id)
+  redis.call('EXPIRE', running, slot_ttl)
+  redis.call('SET', ARGV[6] .. task_id, running, 'EX', slot_ttl)
+end
+
+if ARGV[7] ~= '' then
+  -- 已有排队的运行时新运行排在其后，保证同一空间先到先投递
+  if redis.call('LLEN', pending) == 0 and take() then
+    occupy(ARGV[7])
+    return 1
+  end
+  redis.call('RPUSH', pending, ARGV[8])
+  redis.call('SADD', queued_teams, team_id)
+  return 0
+end
+
+local entry = redis.call('LINDEX', pending, 0)
+if not entry then
+  redis.call('SREM', queued_teams, team_id)
+  return false
+end
+if not take() then
+  return false
+end
+redis.call('LPOP', pending)
+if redis.call('LLEN', pending) == 0 then
+  redis.call('SREM', queued_teams, team_id)
+end
+occupy(string.match(entry, '^[^:]+'))
+return entry
+"""
+
+# KEYS: 各运行的 quota:slot:{task_id}；ARGV: 对应的 task_id
+RELEASE_SCRIPT = """
+for i, slot in ipairs(KEYS) do
+  local running = redis.call('GET', slot)
+  if running then
+    redis.call('ZREM', running, ARGV[i])
+    redis.call('DEL', slot)
+  end
+end
+return 0
+"""
+
+
+@lru_cache
+def _scripts():
+    redis = get_redis()
+    return redis.register_script(ADMIT_SCRIPT), redis.register_script(RELEASE_SCRIPT)
+
+
+class QuotaService:
+    """空间运行配额"""
+
+    @classmethod
+    def team_limits(cls, team: Team) -> tuple[int, int]:
+        """返回（并发运行数上限，每分钟运行数上限），0 表示不限制"""
+        max_running = team.max_concurrent_runs
+        if max_running is None:
+            max_running = settings.TEAM_MAX_CONCURRENT_RUNS
+        rate = team.runs_per_minute
+        if rate is None:
+            rate = settings.TEAM_RUNS_PER_MINUTE
+        return max_running, rate
+
+    @classmethod
+    def _admit(cls, team: Team, client, task_id: str = "", job_id: int | None = None):
+        max_running, rate = cls.team_limits(team)
+        keys = [
+            RUNNING_KEY.format(team_id=team.id),
+            BUCKET_KEY.format(team_id=team.id),
+            PENDING_KEY.format(team_id=team.id),
+            QUEUED_TEAMS_KEY,
+        ]
+        entry = f"{task_id}:{job_id}" if task_id else ""
+        args = [time.time(), team.id, max_running, rate, settings.QUOTA_SLOT_TTL, SLOT_KEY_PREFIX, task_id, entry]
+        return _scripts()[0](keys=keys, args=args, client=client)
+
+    @classmethod
+    def admit(cls, team: Team, runs: list[tuple[str, int]]) -> list[bool]:
+        """按顺序为运行（task_id, job_id）占用配额，返回能否立即投递；不能的进入空间排队队列"""
+        max_running, rate = cls.team_limits(team)
+        if not max_running and not rate:
+            return [True] * len(runs)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for task_id, job_id in runs:
+                cls._admit(team, pipe, task_id, job_id)
+            return [bool(admitted) for admitted in pipe.execute()]
+        except RedisError as e:
+            # Redis 不可用时不限流，避免运行被阻塞
+            logger.warning("Admit runs for team %s failed, dispatching without quota: %s", team.id, e)
+            return [True] * len(runs)
+
+    @classmethod
+    def next_runs(cls, db: Session, limit: int) -> list[tuple[str, int]]:
+        """取出已获得配额的排队运行（task_id, job_id）
+
+        按空间轮转，每轮每个空间最多取一条，排队多的空间不会饿死其他空间。
+        """
+        redis = get_redis()
+        team_ids = {int(team_id) for team_id in redis.smembers(QUEUED_TEAMS_KEY)}
+        if not team_ids:
+            return []
+        teams = db.exec(select(Team).where(Team.id.in_(team_ids))).all()
+        for team_id in team_ids - {team.id for team in teams}:
+            # 空间已删除，丢弃其排队运行
+            redis.delete(PENDING_KEY.format(team_id=team_id))
+            redis.srem(QUEUED_TEAMS_KEY, team_id)
+
+        # 多个进程同时投递时起始空间各不相同
+        active = list(teams)
+        random.shuffle(active)
+        runs = []
+        while active and len(runs) < limit:
+            active = active[: limit - len(runs)]
+            pipe = redis.pipeline(transaction=False)
+            for team in active:
+                cls._admit(team, pipe)
+            entries = pipe.execute()
+            # 本轮未取到的空间（配额已满或队列已空）不再参与后续轮次
+            active = [team for team, entry in zip(active, entries) if entry]
+            for entry in filter(None, entries):
+                task_id, job_id = entry.decode().split(":")
+                runs.append((task_id, int(job_id)))
+        return runs
+
+    @classmethod
+    def discard(cls, team: Team, runs: list[tuple[str, int]]):
+        """撤销未能投递的运行（task_id, job_id）：释放已占用的名额并从空间排队队列移除，Redis 不可用时由名额过期回收"""
+        if not runs:
+            return
+        try:
+            cls.release([task_id for task_id, _ in runs])
+            pipe = get_redis().pipeline(transaction=False)
+            for task_id, job_id in runs:
+                pipe.lrem(PENDING_KEY.format(team_id=team.id), 1, f"{task_id}:{job_id}")
+            pipe.execute()
+        except RedisError as e:
+            logger.warning("Discard runs for team %s failed: %s", team.id, e)
+
+    @classmethod
+    def requeue(cls, runs: list[tuple[str, int, int]]):
+        """将取出后未能投递的运行（task_id, job_id, team_id）放回各空间排队队列的队首，并释放其名额"""
+        if not runs:
+            return
+        cls.release([task_id for task_id, _, _ in runs])
+        pipe = get_redis().pipeline()
+        # 逆序 LPUSH，保持原有的先后顺序
+        for task_id, job_id, team_id in reversed(runs):
+            pipe.lpush(PENDING_KEY.format(team_id=team_id), f"{task_id}:{job_id}")
+            pipe.sadd(QUEUED_TEAMS_KEY, team_id)
+        pipe.execute()
+
+    @classmethod
+    def release(cls, task_ids: list[str]):
+        """任务结束后释放其占用的并发名额，重复释放无副作用"""
+        if not task_ids:
+            return
+        _scripts()[1](keys=[SLOT_KEY_PREFIX + task_id for task_id in task_ids], args=task_ids)
+
+    @classmethod
+    def usage(cls, team: Team) -> dict:
+        """空间当前占用的并发名额与排队数"""
+        max_running, rate = cls.team_limits(team)
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zcount(RUNNING_KEY.format(team_id=team.id), f"({time.time()}", "+inf")
+        pipe.llen(PENDING_KEY.format(team_id=team.id))
+        running, queued = pipe.execute()
+        return {"max_concurrent_runs": max_running, "runs_per_minute": rate, "running": running, "queued": queued}
@@ -0,0 +1,145 @@
+import os
+import gzip
+import json
+import math
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+
+from celery import states
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.models.job import Job, JobDailyStats, JobTasks, Team
+from app.services.task_result import TaskResultService
+
+
+def utc_now() -> datetime:
+    """数据库中保存的是不带时区的 UTC 时间"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """最近秩法分位数"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class RetentionService:
+    """运行记录保留、归档与每日汇总"""
+
+    @classmethod
+    def rollup_day(cls, db: Session, day: date, job_ids: list[int] | None = None) -> int:
+        """汇总某天（UTC）的运行记录，覆盖已有汇总，返回汇总的任务数"""
+        start = datetime.combine(day, time.min)
+        statement = select(
+            JobTasks.job_id,
+            JobTasks.status,
+            JobTasks.returncode,
+            JobTasks.runtime,
+            JobTasks.cpu_user,
+            JobTasks.cpu_system,
+            JobTasks.max_rss,
+            JobTasks.wall_time,
+        ).where(JobTasks.create_at >= start, JobTasks.create_at < start + timedelta(days=1))
+        if job_ids is not None:
+            statement = statement.where(JobTasks.job_id.in_(job_ids))
+        rows_by_job = defaultdict(list)
+        for row in db.exec(statement):
+            rows_by_job[row.job_id].append(row)
+        if not rows_by_job:
+            return 0
+
+        db.exec(delete(JobDailyStats).where(JobDailyStats.day == day, JobDailyStats.job_id.in_(list(rows_by_job))))
+        for job_id, rows in rows_by_job.items():
+            runtimes = [row.runtime for row in rows if row.runtime is not None]
+            # 未记录资源使用的运行（未执行或旧版本 worker）不计入
+            measured = [row for row in rows if row.wall_time is not None]
+            # 任务成功但脚本退出码非 0 也算失败
+            success = sum(1 for row in rows if row.status == states.SUCCESS and not row.returncode)
+            failure = sum(
+                1
+                for row in rows
+                if row.status in (states.FAILURE, states.REVOKED) or (row.status == states.SUCCESS and row.returncode)
+            )
+            db.add(
+                JobDailyStats(
+                    job_id=job_id,
+                    day=day,
+                    total=len(rows),
+                    success=success,
+                    failure=failure,
+                    p50_runtime=percentile(runtimes, 0.5),
+                    p95_runtime=percentile(runtimes, 0.95),
+                    cpu_time=sum((row.cpu_user or 0) + (row.cpu_system or 0) for row in measured) if measured else None,
+                    max_rss=max((row.max_rss or 0 for row in measured), default=None),
+                    wall_time=sum(row.wall_time for row in measured) if measured else None,
+                )
+            )
+        db.commit()
+        return len(rows_by_job)
+
+    @classmethod
+    def purge_expired(cls, db: Session, now: datetime | None = None) -> int:
+        """按各空间的保留天数清理过期运行记录，返回清理条数"""
+        now = now or utc_now()
+        purged = 0
+        for team in db.exec(select(Team)).all():
+            cutoff = now - timedelta(days=team.retention_days or settings.TASK_RETENTION_DAYS)
+            for job_id in db.exec(select(Job.id).where(Job.team_id == team.id)).all():
+                purged += cls.purge_job(db, team.id, job_id, cutoff)
+        return purged
+
+    @classmethod
+    def purge_job(cls, db: Session, team_id: int, job_id: int, cutoff: datetime) -> int:
+        """分批清理单个任务 cutoff 之前的运行记录，每批一次提交"""
+        batch_size = settings.TASK_RETENTION_BATCH_SIZE
+        statement = (
+            select(JobTasks)
+            .where(JobTasks.job_id == job_id, JobTasks.create_at < cutoff)
+            .order_by(JobTasks.create_at)
+            .limit(batch_size)
+        )
+        purged = 0
+        rolled_up: set[date] = set()
+        while job_tasks := db.exec(statement).all():
+            # 删除前补齐缺失的每日汇总（整天的记录此时仍在）
+            days = {job_task.create_at.date() for job_task in job_tasks} - rolled_up
+            if days:
+                existing = db.exec(
+                    select(JobDailyStats.day).where(JobDailyStats.job_id == job_id, JobDailyStats.day.in_(days))
+                ).all()
+                for day in days - set(existing):
+                    cls.rollup_day(db, day, [job_id])
+                rolled_up |= days
+
+            task_ids = [str(job_task.task_id) for job_task in job_tasks]
+            if settings.TASK_ARCHIVE_DIR:
+                cls.archive(team_id, job_id, job_tasks)
+            # 先删结果后端，失败时记录保留，下次重试
+            TaskResultService.forget_many(task_ids)
+            db.exec(delete(JobTasks).where(JobTasks.id.in_([job_task.id for job_task in job_tasks])))
+            db.commit()
+            purged += len(job_tasks)
+            if len(job_tasks) < batch_size:
+                break
+        return purged
+
+    @classmethod
+    def archive(cls, team_id: int, job_id: int, job_tasks: list[JobTasks]):
+        """将运行记录及其结果追加到 {TASK_ARCHIVE_DIR}/{team_id}/{job_id}/{日期}.jsonl.gz"""
+        results = TaskResultService.get_many(job_task.task_id for job_task in job_tasks)
+        records = defaultdict(list)
+        for job_task in job_tasks:
+            record = job_task.model_dump(mode="json")
+            record["result"] = results[str(job_task.task_id)]["result"]
+            records[job_task.create_at.date()].append(record)
+
+        directory = os.path.join(settings.TASK_ARCHIVE_DIR, str(team_id), str(job_id))
+        os.makedirs(directory, exist_ok=True)
+        for day, day_records in records.items():
+            # 追加写入会生成多段 gzip，gzip/zcat 可直接读取
+            with gzip.open(os.path.join(directory, f"{day.isoformat()}.jsonl.gz"), "at", encoding="utf-8") as f:
+                for record in day_records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from celery.schedules import crontab
+
+from app.core import celeryconfig
+from app.models.job import JobSchedule
+
+# cron 表达式按 Celery 时区计算，与 beat 定时任务一致
+SCHEDULE_TZ = ZoneInfo(celeryconfig.timezone)
+
+
+def as_utc(value: datetime) -> datetime:
+    """数据库中保存的是不带时区的 UTC 时间"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def parse_cron(expression: str) -> crontab:
+    """解析 5 段 cron 表达式（分 时 日 月 周），格式错误时抛出 ValueError；相同表达式共用解析结果"""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError("cron expression must have 5 fields: minute hour day month weekday")
+    minute, hour, day_of_month, month_of_year, day_of_week = fields
+    return crontab(
+        minute=minute,
+        hour=hour,
+        day_of_month=day_of_month,
+        month_of_year=month_of_year,
+        day_of_week=day_of_week,
+    )
+
+
+def next_cron_fire(cron: crontab, after: datetime) -> datetime:
+    """after 之后第一个匹配的分钟，按月、日、时、分逐级跳过不匹配的区间
+
+    只使用 crontab 解析出的字段集合：其 remaining_delta 假设上次运行时间与当前时间在同一天，
+    不适合从任意时间点推算。日期与星期需同时满足，与 Celery 一致。
+    """
+    t = after.astimezone(SCHEDULE_TZ).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+    minutes = sorted(cron.minute)
+    end_year = t.year + 5
+    while t.year <= end_year:
+        if t.month not in cron.month_of_year:
+            t = datetime(t.year + t.month // 12, t.month % 12 + 1, 1)
+        elif t.day not in cron.day_of_month or t.isoweekday() % 7 not in cron.day_of_week:
+            t = datetime(t.year, t.month, t.day) + timedelta(days=1)
+        elif t.hour not in cron.hour or t.minute > minutes[-1]:
+            t = datetime(t.year, t.month, t.day, t.hour) + timedelta(hours=1)
+        else:
+            minute = next(minute for minute in minutes if minute >= t.minute)
+            return t.replace(minute=minute, tzinfo=SCHEDULE_TZ).astimezone(timezone.utc)
+    raise ValueError("cron expression never fires")
+
+
+def next_fire(cron: crontab | None, interval: int | None, after: datetime) -> datetime:
+    """after 之后的下一次触发时间（UTC）"""
+    if cron is not None:
+        return next_cron_fire(cron, after)
+    return after + timedelta(seconds=interval)
+
+
+class ScheduleService:
+    """任务定时计划"""
+
+    @classmethod
+    def next_run_at(cls, schedule: JobSchedule) -> datetime | None:
+        """计划的下一次触发时间，错过的触发会在调度进程启动后立即补跑一次"""
+        if not schedule.enabled:
+            return None
+        cron = parse_cron(schedule.cron) if schedule.cron else None
+        return next_fire(cron, schedule.interval, as_utc(schedule.last_run_at or schedule.create_at))
@@ -0,0 +1,46 @@
+import logging
+
+from redis.exceptions import RedisError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.models.job import Job
+from app.tasks.script_cache import script_hash
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_KEY = "script:{digest}"
+
+
+class ScriptStore:
+    """按内容 SHA-256 保存脚本，任务消息只携带哈希，由 worker 按需读取"""
+
+    @classmethod
+    def put(cls, script_content: str) -> str:
+        """保存脚本并返回哈希；Redis 不可用时仅返回哈希，worker 会回退到数据库"""
+        digest = script_hash(script_content)
+        try:
+            get_redis().set(SCRIPT_KEY.format(digest=digest), script_content, ex=settings.SCRIPT_STORE_TTL)
+        except RedisError as e:
+            logger.warning("Store script %s failed: %s", digest, e)
+        return digest
+
+    @classmethod
+    def get(cls, digest: str) -> str | None:
+        """读取脚本内容，Redis 未命中时从任务表读取并回填"""
+        try:
+            content = get_redis().get(SCRIPT_KEY.format(digest=digest))
+            if content is not None:
+                return content.decode()
+        except RedisError as e:
+            logger.warning("Fetch script %s failed: %s", digest, e)
+
+        with Session(engine) as session:
+            statement = select(Job.script_content).where(Job.script_hash == digest).limit(1)
+            content = session.exec(statement).first()
+        if content is not None and script_hash(content) == digest:
+            cls.put(content)
+            return content
+        return None
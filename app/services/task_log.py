@@ -0,0 +1,84 @@
+import time
+from collections.abc import AsyncGenerator
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis import get_async_redis, get_redis
+
+# 每次运行的输出写入一个 Redis Stream
+TASK_LOG_KEY = "task-log:{task_id}"
+# 结束标记，data 为退出码
+EOF_STREAM = "eof"
+
+
+def task_log_key(task_id: str) -> str:
+    return TASK_LOG_KEY.format(task_id=task_id)
+
+
+class TaskLogPublisher:
+    """将脚本输出分批写入 Redis Stream，供 API 实时推送"""
+
+    # 累积到一定字节数或间隔后再写入，减少 Redis 往返
+    FLUSH_BYTES = 8 * 1024
+    FLUSH_INTERVAL = 0.25
+
+    def __init__(self, task_id: str | None):
+        self.key = task_log_key(task_id) if task_id else None
+        self.enabled = settings.TASK_LOG_ENABLED and self.key is not None
+        self._pending: list[tuple[str, str]] = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def publish(self, stream: str, data: str):
+        if not self.enabled or not data:
+            return
+        self._pending.append((stream, data))
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= self.FLUSH_BYTES or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.enabled or not self._pending:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for stream, data in self._pending:
+                pipe.xadd(self.key, {"stream": stream, "data": data}, maxlen=settings.TASK_LOG_MAX_ENTRIES)
+            pipe.expire(self.key, settings.TASK_LOG_TTL)
+            pipe.execute()
+        except RedisError as e:
+            # 日志发布失败不影响脚本执行
+            print(f"Publish task log failed: {str(e)}")
+            self.enabled = False
+        finally:
+            self._pending.clear()
+            self._pending_bytes = 0
+            self._last_flush = time.monotonic()
+
+    def close(self, returncode: int):
+        """写入剩余输出与结束标记"""
+        self.publish(EOF_STREAM, str(returncode))
+        self.flush()
+
+
+async def follow_task_log(task_id: str, last_id: str = "0-0", block_ms: int = 15000) -> AsyncGenerator[tuple, None]:
+    """读取任务日志，产出 (消息ID, 输出流, 内容)；等待超时产出 None，读到结束标记后停止"""
+    client = get_async_redis()
+    key = task_log_key(task_id)
+    while True:
+        entries = await client.xread({key: last_id}, count=100, block=block_ms)
+        if not entries:
+            yield None
+            continue
+        for _, messages in entries:
+            for message_id, fields in messages:
+                last_id = message_id
+                stream = fields[b"stream"].decode()
+                yield message_id.decode(), stream, fields[b"data"].decode()
+                if stream == EOF_STREAM:
+                    return
+
+
+async def task_log_exists(task_id: str) -> bool:
+    return bool(await get_async_redis().exists(task_log_key(task_id)))
@@ -0,0 +1,144 @@
+from datetime import datetime
+from collections.abc import Iterable
+from typing import TypeVar
+
+from celery import states
+from celery.backends.base import KeyValueStoreBackend
+from celery.backends.database import DatabaseBackend
+from celery.backends.redis import RedisBackend
+from celery.utils.iso8601 import parse_iso8601
+from sqlalchemy.orm import load_only
+
+from app.celery import celery_app
+from app.models.job import JobTasks
+from app.schemas.job import TaskResult, TaskResultList
+
+T = TypeVar("T", TaskResult, TaskResultList)
+
+
+class TaskResultService:
+    """任务执行结果查询"""
+
+    @classmethod
+    def get_many(cls, task_ids: Iterable[str]) -> dict[str, dict]:
+        """批量获取任务结果，整页结果只访问一次结果后端"""
+        task_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids))
+        if not task_ids:
+            return {}
+
+        backend = celery_app.backend
+        if isinstance(backend, KeyValueStoreBackend):
+            metas = cls._get_many_from_kv(backend, task_ids)
+        elif isinstance(backend, DatabaseBackend):
+            metas = cls._get_many_from_db(backend, task_ids)
+        else:
+            metas = {task_id: backend.get_task_meta(task_id) for task_id in task_ids}
+
+        return {task_id: cls._normalize(metas.get(task_id)) for task_id in task_ids}
+
+    @classmethod
+    def get(cls, task_id: str) -> dict:
+        """获取单个任务结果"""
+        return cls.get_many([task_id])[str(task_id)]
+
+    @classmethod
+    def forget_many(cls, task_ids: Iterable[str]):
+        """批量删除结果后端中的任务结果"""
+        task_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids))
+        if not task_ids:
+            return
+
+        backend = celery_app.backend
+        if isinstance(backend, RedisBackend):
+            # 一次 DEL 删除整批键
+            backend.client.delete(*[backend.get_key_for_task(task_id) for task_id in task_ids])
+        elif isinstance(backend, DatabaseBackend):
+            session = backend.ResultSession()
+            try:
+                session.query(backend.task_cls).filter(backend.task_cls.task_id.in_(task_ids)).delete(
+                    synchronize_session=False
+                )
+                session.commit()
+            finally:
+                session.close()
+        else:
+            for task_id in task_ids:
+                backend.forget(task_id)
+
+    @classmethod
+    def forget(cls, task_id: str):
+        cls.forget_many([task_id])
+
+    @classmethod
+    def attach_results(cls, job_tasks: list[JobTasks]) -> list[TaskResultList]:
+        """为一页执行记录填充状态，供分页 transformer 使用
+
+        已由任务事件落库的终态记录直接使用，其余记录批量查询结果后端。
+        """
+        unfinished = [job_task.task_id for job_task in job_tasks if job_task.status not in states.READY_STATES]
+        results = cls.get_many(unfinished)
+        return [cls.to_schema(job_task, results.get(str(job_task.task_id)), TaskResultList) for job_task in job_tasks]
+
+    @classmethod
+    def to_schema(cls, job_task: JobTasks, result: dict | None = None, schema: type[T] = TaskResult) -> T:
+        """合并数据库记录与结果后端数据"""
+        update = {"date_done": job_task.finish_at if job_task.status == states.SUCCESS else None}
+        if result and result["status"] != states.PENDING:
+            # 结果后端比事件更新时（如监控线程未运行）以后端为准
+            if states.state(result["status"]) >= states.state(job_task.status):
+                update["status"] = result["status"]
+                update["date_done"] = result["date_done"]
+            if schema is TaskResult:
+                update["result"] = result["result"]
+        return schema.model_validate(job_task, update=update)
+
+    @staticmethod
+    def _get_many_from_kv(backend: KeyValueStoreBackend, task_ids: list[str]) -> dict[str, dict]:
+        """Redis 等键值后端：一次 MGET"""
+        keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+        values = backend.mget(keys)
+        if hasattr(values, "get"):
+            # 部分客户端（如 memcached）返回字典
+            values = [values.get(key) for key in keys]
+
+        return {
+            task_id: backend.decode_result(value)
+            for task_id, value in zip(task_ids, values)
+            if value is not None
+        }
+
+    @staticmethod
+    def _get_many_from_db(backend: DatabaseBackend, task_ids: list[str]) -> dict[str, dict]:
+        """数据库后端：一次 IN 查询"""
+        task_cls = backend.task_cls
+        session = backend.ResultSession()
+        try:
+            rows = (
+                session.query(task_cls)
+                .options(load_only(task_cls.task_id, task_cls.status, task_cls.result, task_cls.date_done))
+                .filter(task_cls.task_id.in_(task_ids))
+                .all()
+            )
+            return {
+                row.task_id: backend.meta_from_decoded(
+                    {"status": row.status, "result": row.result, "date_done": row.date_done}
+                )
+                for row in rows
+            }
+        finally:
+            session.close()
+
+    @staticmethod
+    def _normalize(meta: dict | None) -> dict:
+        """统一结果格式，与 AsyncResult 的取值规则保持一致"""
+        meta = meta or {}
+        status = meta.get("status", states.PENDING)
+        date_done = meta.get("date_done")
+        if date_done and not isinstance(date_done, datetime):
+            date_done = parse_iso8601(date_done)
+        successful = status == states.SUCCESS
+        return {
+            "status": status,
+            "result": meta.get("result") if successful else None,
+            "date_done": date_done if successful else None,
+        }
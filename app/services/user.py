@@ -4,6 +4,7 @@ from sqlmodel import Session, select
 from app.models import User
 from app.schemas.user import UserPubic, UserCreate, UserUpdate
 from app.core.security import get_password_hash
+from app.services.user_cache import user_cache
 
 
 class UserService:
@@ -27,4 +28,15 @@ class UserService:
         db.add(user)
         db.commit()
         db.refresh(user)
-        return user
\ No newline at end of file
+        user_cache.invalidate(user.id)
+        return user
+
+    @classmethod
+    def deactivate_user(cls, db: Session, user: User) -> User:
+        """停用用户，已签发的 token 随即失效"""
+        user.is_active = False
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        user_cache.invalidate(user.id)
+        return user
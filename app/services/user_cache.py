@@ -0,0 +1,123 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# 用户变更时通过该频道通知其他进程失效本地缓存
+INVALIDATE_CHANNEL = "user-cache:invalidate"
+
+
+class UserCache:
+    """认证用户缓存，按 token subject（用户ID）保存用户数据
+
+    每个进程一份，TTL 较短；更新或停用用户时本进程立即失效，并通过 Redis 通知其他进程。
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, user_id: int) -> User | None:
+        """命中时返回游离态的 User，可通过 session.merge(user, load=False) 关联到会话而不查库"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                data = entry[1]
+            else:
+                if entry:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+        user = User.model_validate(data)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, user: User):
+        if not self.enabled:
+            return
+        self._ensure_listener()
+        with self._lock:
+            data = {column.name: getattr(user, column.name) for column in User.__table__.columns}
+            self._entries[user.id] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, broadcast: bool = True):
+        with self._lock:
+            if self._entries.pop(user_id, None):
+                self.invalidations += 1
+        if broadcast and self.enabled:
+            try:
+                get_redis().publish(INVALIDATE_CHANNEL, json.dumps({"user_id": user_id}))
+            except Exception as e:
+                logger.warning("Broadcast user cache invalidation failed: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            # 每次命中省去一次按主键查询用户
+            "db_queries_saved": self.hits,
+            "invalidations": self.invalidations,
+        }
+
+    def _ensure_listener(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        """订阅其他进程的失效通知，连接断开后清空本地缓存并重连"""
+        while True:
+            subscribed = False
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                subscribed = True
+                for message in pubsub.listen():
+                    self.invalidate(json.loads(message["data"])["user_id"], broadcast=False)
+            except Exception as e:
+                logger.warning("User cache invalidation listener error: %s", e)
+            if subscribed:
+                # 断线期间可能错过通知
+                self.clear()
+            time.sleep(5)
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL, settings.USER_CACHE_MAX_SIZE)
@@ -0,0 +1,193 @@
+"""worker 资源使用时间序列
+
+每个 worker 一个定长环形缓冲区，各字段为独立的 array('d')，写满后覆盖最旧的点，内存占用固定。
+负载与任务数来自心跳事件，内存来自 worker-resources 事件（见 app.tasks.resources），
+记录心跳时带上最近一次上报的内存数据。缺失的值记为 NaN，输出时转为 None。
+"""
+
+import logging
+import math
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from redis.exceptions import RedisError
+from sqlalchemy import insert
+from sqlmodel import Session, delete
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import get_redis
+from app.models.job import WorkerMetric
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("ts", "load1", "load5", "load15", "active", "processed", "mem_percent", "rss")
+# 内存数据超过该倍数的上报间隔未更新时视为缺失
+RESOURCES_STALE_FACTOR = 3
+
+
+class RingBuffer:
+    """定长时间序列，按列存储"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.columns = {field: array("d", [math.nan]) * capacity for field in FIELDS}
+        self.head = 0
+        self.count = 0
+
+    def append(self, row: dict):
+        for field, column in self.columns.items():
+            column[self.head] = row.get(field, math.nan)
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def rows(self, since: float = 0.0) -> list[tuple]:
+        """按时间顺序返回 since 之后的点，每行按 FIELDS 排列"""
+        start = (self.head - self.count) % self.capacity
+        indexes = [(start + i) % self.capacity for i in range(self.count)]
+        columns = [self.columns[field] for field in FIELDS]
+        ts = self.columns["ts"]
+        return [tuple(column[i] for column in columns) for i in indexes if ts[i] >= since]
+
+
+def _value(value: float) -> float | None:
+    return None if math.isnan(value) else value
+
+
+def _mean(values: list[float]) -> float | None:
+    values = [value for value in values if not math.isnan(value)]
+    return sum(values) / len(values) if values else None
+
+
+def downsample(rows: list[tuple], step: int) -> list[dict]:
+    """按 step 秒分桶取平均；processed_rate 由相邻点的 processed 增量计算，worker 重启导致的计数回退不计入"""
+    buckets: dict[float, dict] = {}
+    previous = None
+    for row in rows:
+        point = dict(zip(FIELDS, row))
+        key = point["ts"] // step * step if step else point["ts"]
+        bucket = buckets.setdefault(key, {"rows": [], "processed": 0.0, "seconds": 0.0})
+        bucket["rows"].append(point)
+        if previous is not None and not math.isnan(point["processed"]) and not math.isnan(previous["processed"]):
+            delta = point["processed"] - previous["processed"]
+            if delta >= 0 and point["ts"] > previous["ts"]:
+                bucket["processed"] += delta
+                bucket["seconds"] += point["ts"] - previous["ts"]
+        previous = point
+
+    points = []
+    for key, bucket in buckets.items():
+        points.append(
+            {
+                "ts": datetime.fromtimestamp(key, timezone.utc),
+                **{
+                    field: _mean([point[field] for point in bucket["rows"]])
+                    for field in ("load1", "load5", "load15", "active", "mem_percent", "rss")
+                },
+                "processed": _value(bucket["rows"][-1]["processed"]),
+                "processed_rate": bucket["processed"] / bucket["seconds"] if bucket["seconds"] else None,
+            }
+        )
+    return points
+
+
+class WorkerMetricsService:
+    """worker 资源使用时间序列（当前进程内存），可按周期降采样落库"""
+
+    buffers: dict[str, RingBuffer] = {}
+    # worker 最近一次上报的内存数据
+    resources: dict[str, dict] = {}
+    lock = threading.Lock()
+    # 已落库的最后一个周期的结束时间
+    persisted_until: float | None = None
+
+    @classmethod
+    def record_resources(cls, event: dict):
+        with cls.lock:
+            cls.resources[event["hostname"]] = {
+                "ts": event.get("timestamp") or time.time(),
+                "mem_percent": event.get("mem_percent"),
+                "rss": event.get("rss"),
+            }
+
+    @classmethod
+    def record_heartbeat(cls, event: dict):
+        worker = event["hostname"]
+        ts = event.get("timestamp") or time.time()
+        loadavg = event.get("loadavg") or ()
+        row = {"ts": ts, "active": event.get("active"), "processed": event.get("processed")}
+        row.update(zip(("load1", "load5", "load15"), loadavg))
+        with cls.lock:
+            resources = cls.resources.get(worker)
+            if resources and ts - resources["ts"] <= RESOURCES_STALE_FACTOR * settings.WORKER_RESOURCES_INTERVAL:
+                row["mem_percent"] = resources["mem_percent"]
+                row["rss"] = resources["rss"]
+            buffer = cls.buffers.get(worker)
+            if buffer is None:
+                buffer = cls.buffers[worker] = RingBuffer(settings.WORKER_METRICS_CAPACITY)
+            buffer.append({field: float(value) for field, value in row.items() if value is not None})
+
+    @classmethod
+    def workers(cls) -> list[str]:
+        with cls.lock:
+            return sorted(cls.buffers)
+
+    @classmethod
+    def series(cls, worker: str, since: float = 0.0, step: int = 0) -> list[dict] | None:
+        """since 之后的时间序列，step 大于 0 时按 step 秒降采样；未收到过该 worker 的心跳时返回 None"""
+        with cls.lock:
+            buffer = cls.buffers.get(worker)
+            if buffer is None:
+                return None
+            rows = buffer.rows(since)
+        return downsample(rows, step)
+
+    @classmethod
+    def persist(cls) -> int:
+        """将已结束的周期按周期平均落库，并清理超过保留天数的记录，返回写入行数
+
+        各进程的监控线程都收到全部心跳，通过 Redis 按周期加锁，每个周期只由一个进程写入。
+        """
+        interval = settings.WORKER_METRICS_PERSIST_INTERVAL
+        window_end = time.time() // interval * interval
+        since = cls.persisted_until
+        if since is None:
+            # 启动后的第一个周期数据不完整，从下一个周期开始落库
+            cls.persisted_until = window_end
+            return 0
+        if window_end <= since:
+            return 0
+        cls.persisted_until = window_end
+
+        try:
+            if not get_redis().set(f"worker-metrics:persist:{int(window_end)}", 1, nx=True, ex=interval * 2):
+                return 0
+        except RedisError as e:
+            logger.warning("Skip persisting worker metrics: %s", e)
+            return 0
+
+        rows = []
+        for worker in cls.workers():
+            for point in cls.series(worker, since, interval):
+                if point["ts"].timestamp() >= window_end:
+                    continue
+                rows.append(
+                    {
+                        "node_name": worker,
+                        "ts": point["ts"],
+                        "load1": point["load1"],
+                        "active": point["active"],
+                        "processed_rate": point["processed_rate"],
+                        "mem_percent": point["mem_percent"],
+                        "rss": int(point["rss"]) if point["rss"] is not None else None,
+                    }
+                )
+        expire_before = datetime.now(timezone.utc) - timedelta(days=settings.WORKER_METRICS_RETENTION_DAYS)
+        with Session(engine) as session:
+            if rows:
+                session.execute(insert(WorkerMetric), rows)
+            session.exec(delete(WorkerMetric).where(WorkerMetric.ts < expire_before))
+            session.commit()
+        return len(rows)
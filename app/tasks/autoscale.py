@@ -0,0 +1,160 @@
+"""按队列积压与等待时间伸缩 worker 进程池
+
+    celery -A app.celery worker --autoscale=16,2
+
+启用 --autoscale 时 worker 使用 QueueDepthAutoscaler（见 celeryconfig.worker_autoscaler）：
+每 AUTOSCALE_INTERVAL 秒读取所消费队列在 broker 中的消息数，以及监控线程由 task-sent / task-started
+事件计算的最近等待时间，由 AutoscaleController 决定目标进程数。
+
+- 扩容：积压超过 AUTOSCALE_BACKLOG_PER_PROCESS × 进程数，或仍有积压且等待时间超过 AUTOSCALE_MAX_WAIT，
+  连续 AUTOSCALE_UP_TICKS 次后直接扩到足以同时处理积压的进程数
+- 缩容：队列为空且有空闲进程持续 AUTOSCALE_DOWN_DELAY 秒，每次缩掉一半空闲进程
+- 两个条件之间留有间隔（滞后），积压在阈值附近波动时进程数不变
+"""
+
+import logging
+import math
+import statistics
+from dataclasses import dataclass
+from time import monotonic
+
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+from kombu.exceptions import ChannelError, OperationalError
+
+from app.core.config import settings
+from app.services.celery_monitor import recent_task_waits
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AutoscalePolicy:
+    min_processes: int
+    max_processes: int
+    backlog_per_process: float = 1.0
+    max_wait: float = 10.0
+    up_ticks: int = 2
+    down_delay: float = 120.0
+
+
+class AutoscaleController:
+    """伸缩决策，只依赖输入的观测值，可脱离 worker 模拟"""
+
+    def __init__(self, policy: AutoscalePolicy):
+        self.policy = policy
+        self.pressure_ticks = 0
+        self.idle_since: float | None = None
+
+    def decide(self, processes: int, busy: int, backlog: int, wait: float | None, now: float) -> int:
+        """返回目标进程数：processes 当前进程数，busy 执行中任务数，backlog 队列积压，wait 最近等待时间（秒）"""
+        policy = self.policy
+        target = processes
+        overloaded = backlog > policy.backlog_per_process * processes or (
+            backlog > 0 and wait is not None and wait > policy.max_wait
+        )
+        if overloaded:
+            self.idle_since = None
+            self.pressure_ticks += 1
+            if self.pressure_ticks >= policy.up_ticks:
+                self.pressure_ticks = 0
+                target = max(processes + 1, busy + backlog)
+        else:
+            self.pressure_ticks = 0
+            if backlog == 0 and busy < processes:
+                if self.idle_since is None:
+                    self.idle_since = now
+                elif now - self.idle_since >= policy.down_delay:
+                    # 下一次缩容需再空闲 down_delay 秒
+                    self.idle_since = now
+                    target = processes - math.ceil((processes - busy) / 2)
+            else:
+                self.idle_since = None
+        return min(max(target, policy.min_processes), policy.max_processes)
+
+
+def wait_p90(waits: list[float]) -> float | None:
+    """等待时间的 90 分位数，没有样本时返回 None"""
+    if len(waits) < 2:
+        return waits[0] if waits else None
+    return statistics.quantiles(waits, n=10)[-1]
+
+
+def queue_backlog(channel, queues: list[str]) -> int:
+    """队列中等待的消息数（不含已预取到 worker 的消息），队列不存在时计为 0"""
+    backlog = 0
+    for queue in queues:
+        try:
+            backlog += channel.queue_declare(queue=queue, passive=True).message_count
+        except ChannelError:
+            # Redis 中空队列的键不存在
+            continue
+    return backlog
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    """按 broker 队列积压与等待时间伸缩进程池，替代 Celery 默认的按已预取任务数伸缩"""
+
+    def __init__(self, pool, max_concurrency, min_concurrency=0, worker=None, keepalive=None, mutex=None):
+        # keepalive 同时是事件循环中的检查间隔
+        super().__init__(
+            pool, max_concurrency, min_concurrency, worker=worker, keepalive=settings.AUTOSCALE_INTERVAL, mutex=mutex
+        )
+        self.controller = AutoscaleController(
+            AutoscalePolicy(
+                min_processes=min_concurrency,
+                max_processes=max_concurrency,
+                backlog_per_process=settings.AUTOSCALE_BACKLOG_PER_PROCESS,
+                max_wait=settings.AUTOSCALE_MAX_WAIT,
+                up_ticks=settings.AUTOSCALE_UP_TICKS,
+                down_delay=settings.AUTOSCALE_DOWN_DELAY,
+            )
+        )
+        self.connection = None
+        self.last_check = 0.0
+
+    def queues(self) -> list[str]:
+        return list(self.worker.app.amqp.queues.consume_from or self.worker.app.amqp.queues)
+
+    def backlog(self, queues: list[str]) -> int | None:
+        try:
+            if self.connection is None:
+                self.connection = self.worker.app.connection_for_read()
+            return queue_backlog(self.connection.default_channel, queues)
+        except (OperationalError, OSError) as e:
+            logger.warning("Read queue backlog failed: %s", e)
+            if self.connection is not None:
+                self.connection.release()
+                self.connection = None
+            return None
+
+    def _maybe_scale(self, req=None):
+        # 每收到一条任务消息也会调用，按间隔限制 broker 查询
+        now = monotonic()
+        if now - self.last_check < self.keepalive:
+            return False
+        self.last_check = now
+
+        queues = self.queues()
+        backlog = self.backlog(queues)
+        if backlog is None:
+            return False
+        waits = recent_task_waits(queues, settings.AUTOSCALE_WAIT_WINDOW)
+        # 远程控制 autoscale 命令可修改上下限
+        self.controller.policy.min_processes = self.min_concurrency
+        self.controller.policy.max_processes = self.max_concurrency
+        processes = self.processes
+        target = self.controller.decide(processes, len(state.active_requests), backlog, wait_p90(waits), now)
+        if target > processes:
+            self.scale_up(target - processes)
+            return True
+        if target < processes:
+            self._shrink(processes - target)
+            return True
+        return False
+
+    def stop(self):
+        if self.connection is not None:
+            self.connection.release()
+            self.connection = None
+        super().stop()
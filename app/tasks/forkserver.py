@@ -0,0 +1,321 @@
+"""预热的 Python 脚本执行进程（fork server）
+
+服务端以独立进程运行（仅依赖标准库），启动时预先导入常用模块，之后为每个任务 fork
+一个子进程执行脚本，省去解释器启动与模块导入的开销。子进程与 run_process 一致：
+新建会话（setsid）并限制 CPU 时间。
+
+协议：客户端通过 Unix socket 发送一行 JSON 请求，并用 SCM_RIGHTS 传递 stdout/stderr
+管道的写端；服务端返回 {"pid": ...}，子进程退出后返回 {"returncode": ..., "usage": ...}，
+usage 为 wait4 取得的资源使用（见 rusage_dict）。
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+import selectors
+import subprocess
+from typing import Any, Callable
+
+# 与 run_process 中 preexec_function 的限制保持一致
+CPU_LIMIT = 30
+MAX_REQUEST_SIZE = 64 * 1024
+
+
+def rusage_dict(rusage, wall_time: float) -> dict:
+    """子进程（含其已回收的后代进程）的 CPU 时间、峰值内存（字节）、上下文切换次数与墙钟时间
+
+    Linux 的 ru_maxrss 包含 exec 之前 fork 出的进程的内存，峰值内存不低于发起 fork 的进程在 fork 时的常驻内存。
+    """
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节
+    max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {
+        "cpu_user": round(rusage.ru_utime, 6),
+        "cpu_system": round(rusage.ru_stime, 6),
+        "max_rss": max_rss,
+        "ctx_switches_voluntary": rusage.ru_nvcsw,
+        "ctx_switches_involuntary": rusage.ru_nivcsw,
+        "wall_time": round(wall_time, 6),
+    }
+
+
+def _run_script(path: str, args: list[str]) -> int:
+    """在 fork 出的子进程中执行脚本，返回退出码"""
+    import marshal
+    import runpy
+    import traceback
+
+    sys.argv = [path, *args]
+    # 与 `python <path>` 一致，脚本所在目录作为 sys.path[0]，而非 fork server 自身的目录
+    sys.path[0] = os.path.dirname(os.path.abspath(path))
+    try:
+        if path.endswith(".pyc"):
+            with open(path, "rb") as f:
+                # 跳过 16 字节的 pyc 头
+                code = marshal.loads(f.read()[16:])
+            exec(code, {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__})
+        else:
+            runpy.run_path(path, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # 隐藏 fork server 自身的调用栈
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != path:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        return 1
+
+
+def _spawn(request: dict, fds: list[int], inherited: tuple[socket.socket | selectors.BaseSelector, ...]) -> int:
+    """fork 子进程执行脚本；inherited 为服务端持有的 socket 与 selector，子进程中全部关闭"""
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # 子进程：与 run_process 相同的隔离设置
+    code = 1
+    try:
+        import random
+        import resource
+
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for obj in inherited:
+            obj.close()
+        os.setsid()
+        resource.setrlimit(resource.RLIMIT_CPU, (CPU_LIMIT, CPU_LIMIT))
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in (devnull, *fds):
+            os.close(fd)
+        random.seed()
+        code = _run_script(request["path"], request.get("args") or [])
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code & 0xFF)
+
+
+def serve(socket_path: str, preload: list[str]):
+    """fork server 主循环"""
+    import importlib
+
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"Preload {module} failed: {e}", file=sys.stderr)
+
+    # 子进程退出时通过 wakeup fd 唤醒主循环，及时回收并返回退出码
+    wakeup_r, wakeup_w = socket.socketpair()
+    wakeup_r.setblocking(False)
+    wakeup_w.setblocking(False)
+    signal.set_wakeup_fd(wakeup_w.fileno(), warn_on_full_buffer=False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    # 监听后再改名，客户端看到 socket 文件即可连接
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(f"{socket_path}.tmp")
+    listener.listen(64)
+    os.rename(f"{socket_path}.tmp", socket_path)
+    parent_pid = os.getppid()
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    # pid -> 与客户端的连接、fork 时间
+    conns: dict[int, socket.socket] = {}
+    started: dict[int, float] = {}
+
+    # worker 进程退出后随之退出
+    while os.getppid() == parent_pid:
+        for key, _ in selector.select(timeout=1):
+            if key.fileobj is wakeup_r:
+                try:
+                    while wakeup_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            elif key.fileobj is listener:
+                conn, _ = listener.accept()
+                fds: list[int] = []
+                try:
+                    msg, fds, _, _ = socket.recv_fds(conn, MAX_REQUEST_SIZE, 2)
+                    if len(fds) != 2:
+                        raise ValueError("stdout/stderr descriptors required")
+                    inherited = (selector, listener, wakeup_r, wakeup_w, conn, *conns.values())
+                    pid = _spawn(json.loads(msg), fds, inherited)
+                except Exception as e:
+                    conn.sendall(json.dumps({"error": str(e)}).encode() + b"\n")
+                    conn.close()
+                    continue
+                finally:
+                    # 写端已由子进程继承
+                    for fd in fds:
+                        os.close(fd)
+                started[pid] = time.monotonic()
+                conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+                conns[pid] = conn
+                selector.register(conn, selectors.EVENT_READ, pid)
+            else:
+                # 客户端断开（如 worker 退出），终止对应任务
+                pid = key.data
+                selector.unregister(key.fileobj)
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+        # 回收已结束的子进程（含被终止的），返回退出码与资源使用
+        while conns:
+            try:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            conn = conns.pop(pid, None)
+            usage = rusage_dict(rusage, time.monotonic() - started.pop(pid, time.monotonic()))
+            if conn is None:
+                continue
+            returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            try:
+                selector.unregister(conn)
+            except KeyError:
+                pass
+            try:
+                conn.sendall(json.dumps({"returncode": returncode, "usage": usage}).encode() + b"\n")
+            except OSError:
+                pass
+            conn.close()
+
+
+class ForkServerError(Exception):
+    pass
+
+
+class MessageReader:
+    """按行读取服务端消息，读取超时后仍可继续读取"""
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.buffer = b""
+
+    def read(self) -> dict[str, Any]:
+        while b"\n" not in self.buffer:
+            data = self.conn.recv(4096)
+            if not data:
+                raise ForkServerError("Fork server closed the connection")
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        message = json.loads(line)
+        if "error" in message:
+            raise ForkServerError(message["error"])
+        return message
+
+
+class ForkServer:
+    """fork server 客户端，每个 worker 进程持有一个"""
+
+    def __init__(self, python_command: str, socket_path: str, preload: list[str]):
+        self.python_command = python_command
+        self.socket_path = socket_path
+        self.preload = preload
+        self.proc: subprocess.Popen | None = None
+
+    def start(self, timeout: float = 10):
+        if self.proc and self.proc.poll() is None:
+            return
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path), mode=0o700, exist_ok=True)
+        self.proc = subprocess.Popen(
+            [self.python_command, "-u", os.path.abspath(__file__), self.socket_path, ",".join(self.preload)],
+            stdin=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(self.socket_path):
+            if self.proc.poll() is not None or time.monotonic() > deadline:
+                raise ForkServerError("Fork server failed to start")
+            time.sleep(0.01)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def run(
+        self,
+        script_path: str,
+        args: list[str],
+        timeout: float,
+        stream_output: Callable[..., tuple[dict, bool]],
+        on_output: Callable[[str, str], None] | None = None,
+        on_idle: Callable[[], None] | None = None,
+    ) -> tuple[dict, bool, int, dict]:
+        """执行脚本，返回 (输出缓冲, 是否超时, 退出码, 资源使用)；输出读取复用 run_process 的 stream_output"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            request = json.dumps({"path": script_path, "args": args}).encode()
+            socket.send_fds(conn, [request], [stdout_w, stderr_w])
+            os.close(stdout_w)
+            os.close(stderr_w)
+            stdout_w = stderr_w = None
+            reader = MessageReader(conn)
+            pid = reader.read()["pid"]
+
+            pipes = {"stdout": stdout_r, "stderr": stderr_r}
+            buffers, timed_out = stream_output(pipes, deadline, on_output, on_idle)
+            if timed_out:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            conn.settimeout(max(deadline - time.monotonic(), 0.1))
+            try:
+                message = reader.read()
+            except socket.timeout:
+                # 输出已关闭但进程仍在运行
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                timed_out = True
+                conn.settimeout(5)
+                message = reader.read()
+            return buffers, timed_out, message["returncode"], message.get("usage")
+        except OSError as e:
+            if e.errno in (errno.ECONNREFUSED, errno.ENOENT):
+                # fork server 已退出，下次调用时重启
+                self.stop()
+            raise
+        finally:
+            conn.close()
+            for fd in (stdout_r, stderr_r, stdout_w, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], [module for module in sys.argv[2].split(",") if module])
@@ -0,0 +1,59 @@
+import os
+
+import psutil
+from celery import bootsteps
+
+from app.core.config import settings
+
+
+def consumer_info(c) -> dict:
+    """worker 消费的队列与并发数，供负载感知投递选择节点"""
+    return {
+        "queues": [queue.name for queue in c.task_consumer.queues] if c.task_consumer else [],
+        "concurrency": c.pool.num_processes,
+        "cpu_count": psutil.cpu_count(),
+    }
+
+
+def collect_resources(process: psutil.Process) -> dict:
+    """worker 主进程及其子进程（执行池、脚本进程）的内存占用与主机内存、CPU 使用率"""
+    rss = 0
+    for proc in [process, *process.children(recursive=True)]:
+        try:
+            rss += proc.memory_info().rss
+        except psutil.Error:
+            # 子进程已退出
+            continue
+    memory = psutil.virtual_memory()
+    return {
+        "rss": rss,
+        "mem_percent": memory.percent,
+        "mem_available": memory.available,
+        "cpu_percent": psutil.cpu_percent(interval=None),
+    }
+
+
+class ResourceReporter(bootsteps.StartStopStep):
+    """定期发送 worker-resources 事件，监控线程将其与心跳中的负载、任务数合并为时间序列
+
+    Celery 心跳事件只包含 loadavg、active、processed，内存数据与消费队列、并发数由该事件补充。
+    """
+
+    requires = {"celery.worker.consumer.events:Events"}
+
+    def __init__(self, c, **kwargs):
+        self.tref = None
+        self.process = psutil.Process(os.getpid())
+
+    def start(self, c):
+        if settings.WORKER_RESOURCES_INTERVAL > 0:
+            self.tref = c.timer.call_repeatedly(settings.WORKER_RESOURCES_INTERVAL, self.send, (c,), priority=10)
+
+    def stop(self, c):
+        if self.tref:
+            self.tref.cancel()
+            self.tref = None
+
+    def send(self, c):
+        if c.event_dispatcher and c.event_dispatcher.enabled:
+            c.event_dispatcher.send("worker-resources", **collect_resources(self.process), **consumer_info(c))
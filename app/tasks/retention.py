@@ -0,0 +1,22 @@
+from datetime import date, timedelta
+
+from sqlmodel import Session
+
+from app.celery import celery_app
+from app.core.db import engine
+from app.services.retention import RetentionService, utc_now
+
+
+@celery_app.task
+def rollup_job_stats(day: str | None = None) -> int:
+    """汇总指定日期（默认前一天，UTC）的运行记录"""
+    day = date.fromisoformat(day) if day else (utc_now() - timedelta(days=1)).date()
+    with Session(engine) as db:
+        return RetentionService.rollup_day(db, day)
+
+
+@celery_app.task
+def purge_job_tasks() -> int:
+    """清理超过保留期的运行记录及其任务结果"""
+    with Session(engine) as db:
+        return RetentionService.purge_expired(db)
@@ -0,0 +1,130 @@
+import os
+import hashlib
+import subprocess
+import tempfile
+from typing import Tuple
+
+# 由执行脚本的解释器完成编译，保证字节码与运行时版本一致
+COMPILE_SNIPPET = "import py_compile, sys; py_compile.compile(sys.argv[1], cfile=sys.argv[2], doraise=True)"
+SCRIPT_EXTENSIONS = {"python": ".py", "shell": ".sh"}
+
+
+def script_hash(script_content: str) -> str:
+    return hashlib.sha256(script_content.encode()).hexdigest()
+
+
+class ScriptCache:
+    """worker 本地脚本缓存
+
+    文件按内容 SHA-256 命名，同一 worker 的多个进程共享目录；命中时只更新 mtime，
+    总数或总大小超限时按 mtime 淘汰最久未使用的脚本。
+    """
+
+    def __init__(self, root: str, max_entries: int, max_bytes: int, python_command: str = "python3"):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.python_command = python_command
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, script_content: str, script_type: str) -> Tuple[str, bool]:
+        """返回可直接执行的脚本路径及是否命中缓存"""
+        path = self.lookup(script_hash(script_content), script_type)
+        if path:
+            return path, True
+        return self._add(script_content, script_type), False
+
+    def lookup(self, digest: str, script_type: str) -> str | None:
+        """按哈希查找已缓存的脚本，无需脚本内容"""
+        source_path = os.path.join(self.root, f"{digest}{SCRIPT_EXTENSIONS[script_type]}")
+        compiled_path = f"{source_path}c"
+        path = compiled_path if script_type == "python" and os.path.exists(compiled_path) else source_path
+        try:
+            # 刷新 mtime 作为 LRU 依据
+            os.utime(path)
+            self.hits += 1
+            return path
+        except FileNotFoundError:
+            return None
+
+    def _add(self, script_content: str, script_type: str) -> str:
+        """写入脚本并预编译，返回可执行路径"""
+        source_path = os.path.join(self.root, f"{script_hash(script_content)}{SCRIPT_EXTENSIONS[script_type]}")
+        compiled_path = f"{source_path}c"
+        path = source_path
+        self.misses += 1
+        self._ensure_root()
+        self._write(source_path, script_content)
+        if script_type == "python" and self._compile(source_path, compiled_path):
+            path = compiled_path
+        self._evict()
+        return path
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _ensure_root(self):
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+
+    def _write(self, path: str, content: str):
+        """先写临时文件再原子替换，避免并发进程读到半个文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o500)  # 只读且可执行
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _compile(self, source_path: str, compiled_path: str) -> bool:
+        """预编译为字节码；语法错误时返回 False，运行源文件以输出原始错误"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_", suffix=".pyc")
+        os.close(fd)
+        try:
+            subprocess.run(
+                [self.python_command, "-c", COMPILE_SNIPPET, source_path, tmp_path],
+                check=True,
+                capture_output=True,
+                timeout=30,
+            )
+            os.chmod(tmp_path, 0o500)
+            os.replace(tmp_path, compiled_path)
+            return True
+        except (subprocess.SubprocessError, OSError):
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
+
+    def _evict(self):
+        """按脚本（源文件与字节码一起）淘汰最久未使用的条目"""
+        entries: dict[str, list] = {}
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".tmp_"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = entry.name.split(".", 1)[0]
+            item = entries.setdefault(key, [0.0, 0, []])
+            item[0] = max(item[0], stat.st_mtime)
+            item[1] += stat.st_size
+            item[2].append(entry.path)
+
+        total_bytes = sum(item[1] for item in entries.values())
+        count = len(entries)
+        for mtime, size, paths in sorted(entries.values(), key=lambda item: item[0]):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            count -= 1
+            total_bytes -= size
+            self.evictions += 1
@@ -1,17 +1,26 @@
 import os
+import atexit
+import codecs
+import selectors
 import subprocess
-import tempfile
-import shutil
-from typing import Tuple, Dict, Any
+import time
+from typing import Tuple, Dict, Any, Callable
 import psutil
-import hashlib
 import re
 
 from app.celery import celery_app
+from app.core.config import settings
+from app.services.script_store import ScriptStore
+from app.services.task_log import TaskLogPublisher
+from app.tasks.forkserver import ForkServer, rusage_dict
+from app.tasks.script_cache import ScriptCache
 
 # 安全配置
 MAX_EXECUTION_TIME = 30  # 秒
-MAX_OUTPUT_SIZE = 1024 * 1024  # 1MB
+MAX_OUTPUT_SIZE = 1024 * 1024  # 1MB，超出时保留头尾各一半
+READ_CHUNK_SIZE = 64 * 1024
+# 无输出时调用 on_idle 的间隔，与日志发布的批量间隔一致
+IDLE_INTERVAL = TaskLogPublisher.FLUSH_INTERVAL
 ALLOWED_TYPES = {"python", "shell"}
 MAX_SCRIPT_SIZE = 100 * 1024  # 100KB
 SAFE_COMMANDS = {"python": ["python3", "-u"], "shell": ["/bin/bash", "--noprofile", "--norc"]}
@@ -21,26 +30,13 @@ class ExecutionTimeout(Exception):
     pass
 
 
-def create_temp_script(script_content: str, script_type: str) -> str:
-    """创建临时脚本文件"""
-    valid_extensions = {"python": ".py", "shell": ".sh"}
-
-    # 生成安全文件名
-    content_hash = hashlib.sha256(script_content.encode()).hexdigest()[:16]
-    filename = f"script_{content_hash}{valid_extensions[script_type]}"
-
-    temp_dir = tempfile.mkdtemp(prefix="script_runner_", dir="/tmp")
-    script_path = os.path.join(temp_dir, filename)
-
-    # 写入脚本内容
-    with open(script_path, "w") as f:
-        f.write(script_content)
-
-    # 设置文件权限
-    os.chmod(script_path, 0o500)  # 只读且可执行
-    os.chmod(temp_dir, 0o700)  # 限制目录权限
-
-    return script_path, temp_dir
+# 每个 worker 进程一个实例，同一节点的进程共享缓存目录
+script_cache = ScriptCache(
+    settings.SCRIPT_CACHE_DIR,
+    max_entries=settings.SCRIPT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.SCRIPT_CACHE_MAX_BYTES,
+    python_command=SAFE_COMMANDS["python"][0],
+)
 
 
 def validate_script_content(script_content: str, script_type: str) -> bool:
@@ -70,8 +66,102 @@ def validate_script_content(script_content: str, script_type: str) -> bool:
     return True
 
 
-def run_process(command: list, timeout: int) -> Tuple[str, str, int]:
-    """安全执行进程（保持原实现）"""
+class OutputBuffer:
+    """有界输出缓冲，超出上限时保留头部与尾部"""
+
+    def __init__(self, limit: int = MAX_OUTPUT_SIZE):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.truncated = 0
+
+    def write(self, data: bytes):
+        if len(self.head) < self.head_limit:
+            size = self.head_limit - len(self.head)
+            self.head += data[:size]
+            data = data[size:]
+        if data:
+            self.tail += data
+            overflow = len(self.tail) - self.tail_limit
+            if overflow > 0:
+                del self.tail[:overflow]
+                self.truncated += overflow
+
+    def getvalue(self) -> str:
+        if not self.truncated:
+            return (self.head + self.tail).decode(errors="replace")
+        head = self.head.decode(errors="replace")
+        tail = self.tail.decode(errors="replace")
+        return f"{head}\n... [{self.truncated} bytes truncated] ...\n{tail}"
+
+
+def stream_output(
+    pipes: Dict[str, Any],
+    deadline: float,
+    on_output: Callable[[str, str], None] | None = None,
+    on_idle: Callable[[], None] | None = None,
+) -> Tuple[Dict[str, OutputBuffer], bool]:
+    """增量读取子进程输出到有界缓冲，返回 (各输出流缓冲, 是否超时)
+
+    on_idle 在 IDLE_INTERVAL 内没有新输出时调用，用于写出已缓冲的实时日志。
+    """
+    buffers = {name: OutputBuffer() for name in pipes}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in pipes}
+    selector = selectors.DefaultSelector()
+    for name, pipe in pipes.items():
+        selector.register(pipe, selectors.EVENT_READ, name)
+
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return buffers, True
+            events = selector.select(timeout=min(remaining, IDLE_INTERVAL) if on_idle else remaining)
+            if not events and on_idle:
+                on_idle()
+            for key, _ in events:
+                data = os.read(key.fd, READ_CHUNK_SIZE)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    continue
+                buffers[key.data].write(data)
+                if on_output:
+                    on_output(key.data, decoders[key.data].decode(data))
+    finally:
+        selector.close()
+    return buffers, False
+
+
+def wait_with_rusage(proc: subprocess.Popen, timeout: float | None = None) -> dict | None:
+    """用 wait4 回收子进程并返回其资源使用，timeout 秒内未退出时返回 None
+
+    与 Popen.wait 一样以递增间隔轮询；回收后设置 proc.returncode，Popen 不会再次等待。
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        delay = min(delay * 2, remaining, 0.05)
+        time.sleep(delay)
+
+
+def run_process(
+    command: list,
+    timeout: int,
+    on_output: Callable[[str, str], None] | None = None,
+    on_idle: Callable[[], None] | None = None,
+) -> Tuple[str, str, int, dict | None]:
+    """安全执行进程，增量读取输出，on_output 用于实时转发输出片段
+
+    返回 (stdout, stderr, 退出码, 资源使用)，超时被终止的进程同样返回资源使用；未能启动时资源使用为 None。
+    """
 
     def preexec_function():
         """子进程环境设置"""
@@ -82,43 +172,130 @@ def run_process(command: list, timeout: int) -> Tuple[str, str, int]:
         os.setsid()
 
     try:
-        proc = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=preexec_function, text=True
+        start = time.monotonic()
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=preexec_function)
+
+        with proc:
+            deadline = start + timeout
+            pipes = {"stdout": proc.stdout, "stderr": proc.stderr}
+            buffers, timed_out = stream_output(pipes, deadline, on_output, on_idle)
+            stdout, stderr = buffers["stdout"].getvalue(), buffers["stderr"].getvalue()
+            rusage = None
+            if not timed_out:
+                # 输出已关闭但进程可能仍在运行
+                rusage = wait_with_rusage(proc, max(deadline - time.monotonic(), 0))
+                timed_out = rusage is None
+            if timed_out:
+                # 终止整个进程组；进程可能恰好已退出，仍照常回收
+                try:
+                    parent = psutil.Process(proc.pid)
+                    for child in parent.children(recursive=True):
+                        try:
+                            child.kill()
+                        except psutil.NoSuchProcess:
+                            pass
+                    parent.kill()
+                except psutil.NoSuchProcess:
+                    pass
+                usage = rusage_dict(wait_with_rusage(proc), time.monotonic() - start)
+                # 保留超时前的输出
+                return stdout, "\n".join(filter(None, [stderr, "Execution timed out"])), -1, usage
+
+        return stdout, stderr, proc.returncode, rusage_dict(rusage, time.monotonic() - start)
+
+    except Exception as e:
+        return "", str(e)[:MAX_OUTPUT_SIZE], -1, None
+
+
+# 当前进程的 fork server 及其所属 pid，prefork 子进程不复用父进程的实例
+_forkserver: Tuple[int, ForkServer] | None = None
+
+
+def get_forkserver() -> ForkServer:
+    global _forkserver
+    if _forkserver is None or _forkserver[0] != os.getpid():
+        server = ForkServer(
+            SAFE_COMMANDS["python"][0],
+            os.path.join(settings.FORKSERVER_SOCKET_DIR, f"{os.getpid()}.sock"),
+            settings.FORKSERVER_PRELOAD,
         )
+        atexit.register(server.stop)
+        _forkserver = (os.getpid(), server)
+    return _forkserver[1]
+
+
+def run_in_forkserver(
+    script_path: str,
+    args: list,
+    timeout: int,
+    on_output: Callable[[str, str], None] | None = None,
+    on_idle: Callable[[], None] | None = None,
+) -> Tuple[str, str, int, dict | None]:
+    """在预热的 fork server 中执行 Python 脚本，返回值与 run_process 一致"""
+    try:
+        server = get_forkserver()
+        buffers, timed_out, returncode, usage = server.run(
+            script_path, args, timeout, stream_output, on_output, on_idle
+        )
+        stdout, stderr = buffers["stdout"].getvalue(), buffers["stderr"].getvalue()
+        if timed_out:
+            return stdout, "\n".join(filter(None, [stderr, "Execution timed out"])), -1, usage
+        return stdout, stderr, returncode, usage
 
-        try:
-            stdout, stderr = proc.communicate(timeout=timeout)
-        except subprocess.TimeoutExpired:
-            # 终止整个进程组
-            parent = psutil.Process(proc.pid)
-            for child in parent.children(recursive=True):
-                child.kill()
-            parent.kill()
-            raise ExecutionTimeout("Execution timed out")
+    except Exception as e:
+        return "", str(e)[:MAX_OUTPUT_SIZE], -1, None
 
-        return stdout[:MAX_OUTPUT_SIZE], stderr[:MAX_OUTPUT_SIZE], proc.returncode
 
+def report_outcome(task, **fields):
+    """发送执行概要事件，由监控线程写入 JobTasks"""
+    try:
+        task.send_event("task-outcome", **fields)
     except Exception as e:
-        return "", str(e)[:MAX_OUTPUT_SIZE], -1
+        print(f"Report outcome failed: {str(e)}")
+
+
+def resolve_script(script_content: str | None, script_type: str, script_hash: str | None) -> Tuple[str, bool]:
+    """获取可执行的缓存脚本路径及是否命中；消息只带哈希时，本地未命中才读取脚本内容"""
+    if script_content is None:
+        if not script_hash:
+            raise ValueError("Script content or hash required")
+        # 缓存中的脚本写入前均已通过校验
+        script_path = script_cache.lookup(script_hash, script_type)
+        if script_path:
+            return script_path, True
+        script_content = ScriptStore.get(script_hash)
+        if script_content is None:
+            raise ValueError(f"Script {script_hash} not found")
+
+    # 内容安全校验
+    if not validate_script_content(script_content, script_type):
+        raise ValueError("Script content validation failed")
+
+    # 获取缓存脚本，未命中时写入并预编译
+    return script_cache.get(script_content, script_type)
+
+
+class ScriptFailed(Exception):
+    """脚本退出码非 0，fail_on_error 时抛出使任务失败（流水线据此停止下游节点），不重试"""
 
 
 @celery_app.task(bind=True, max_retries=3)
-def execute_script_content(self, script_content: str, script_type: str, params: Dict[str, Any] = None):
-    """基于内容的脚本执行任务"""
-    temp_paths = {}
+def execute_script_content(
+    self,
+    script_content: str | None,
+    script_type: str,
+    params: Dict[str, Any] = None,
+    script_hash: str | None = None,
+    fail_on_error: bool = False,
+):
+    """基于内容的脚本执行任务，script_content 为空时按 script_hash 从脚本存储读取"""
     try:
         # 参数校验
         params = params or {}
         if script_type not in ALLOWED_TYPES:
             raise ValueError("Invalid script type")
 
-        # 内容安全校验
-        if not validate_script_content(script_content, script_type):
-            raise ValueError("Script content validation failed")
-
-        # 创建临时脚本文件
-        script_path, temp_dir = create_temp_script(script_content, script_type)
-        temp_paths = {"script_path": script_path, "temp_dir": temp_dir}
+        script_path, cache_hit = resolve_script(script_content, script_type, script_hash)
 
         # 准备执行命令
         command = SAFE_COMMANDS[script_type].copy()
@@ -128,24 +305,43 @@ def execute_script_content(self, script_content: str, script_type: str, params:
             command.append(script_path)
 
         # 添加用户参数
-        if params.get("args"):
-            command += params["args"]
+        args = params.get("args") or []
+        command += args
 
         # 执行脚本
         timeout = params.get("timeout", MAX_EXECUTION_TIME)
-        stdout, stderr, returncode = run_process(command, timeout)
+        log_publisher = TaskLogPublisher(self.request.id)
+        if script_type == "python" and settings.SCRIPT_EXECUTION_MODE == "forkserver":
+            stdout, stderr, returncode, usage = run_in_forkserver(
+                script_path, args, timeout, on_output=log_publisher.publish, on_idle=log_publisher.flush
+            )
+        else:
+            stdout, stderr, returncode, usage = run_process(
+                command, timeout, on_output=log_publisher.publish, on_idle=log_publisher.flush
+            )
+        log_publisher.close(returncode)
 
         # 记录结果
-        result = {"stdout": stdout, "stderr": stderr, "returncode": returncode, "success": returncode == 0}
+        result = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "returncode": returncode,
+            "success": returncode == 0,
+            "usage": usage,
+        }
+        report_outcome(
+            self,
+            returncode=returncode,
+            script_cache="hit" if cache_hit else "miss",
+            output_bytes=len(stdout.encode()) + len(stderr.encode()),
+            usage=usage,
+        )
+        if fail_on_error and returncode != 0:
+            raise ScriptFailed(f"Script exited with code {returncode}")
 
         return result
 
+    except ScriptFailed:
+        raise
     except Exception as e:
         self.retry(exc=e, countdown=2**self.request.retries)
-    finally:
-        # 清理临时文件
-        if temp_paths.get("temp_dir"):
-            try:
-                shutil.rmtree(temp_paths["temp_dir"])
-            except Exception as e:
-                print(f"Cleanup failed: {str(e)}")
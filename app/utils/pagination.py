@@ -0,0 +1,80 @@
+"""基于 (create_at, id) 的游标分页
+
+与 fastapi_pagination 的偏移分页相比不执行 COUNT(*)，也没有深 OFFSET，
+翻页耗时与页码无关，适用于运行记录等大表；前端的小表仍可使用偏移分页。
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Generic, Sequence, TypeVar
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """游标分页结果"""
+
+    items: list[T]
+    size: int
+    next_cursor: str | None = Field(default=None, description="下一页游标，为空表示没有更多数据")
+
+
+class CursorParams(BaseModel):
+    """游标分页参数"""
+
+    cursor: str | None = Query(default=None, description="上一页返回的 next_cursor")
+    size: int = Query(default=50, ge=1, le=100, description="每页数量")
+
+
+def encode_cursor(create_at: datetime, id: int) -> str:
+    data = json.dumps([create_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        create_at, id = json.loads(data)
+        return datetime.fromisoformat(create_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate_cursor(
+    session: AsyncSession,
+    statement: Any,
+    model: Any,
+    params: CursorParams,
+    transformer: Callable[[Sequence[Any]], Awaitable[Sequence[Any]]] | None = None,
+    descending: bool = True,
+) -> CursorPage:
+    """按 (create_at, id) 做键集分页，model 需包含 create_at 与 id 字段"""
+    if descending:
+        statement = statement.order_by(model.create_at.desc(), model.id.desc())
+    else:
+        statement = statement.order_by(model.create_at, model.id)
+    if params.cursor:
+        create_at, id = decode_cursor(params.cursor)
+        # 展开的行比较，MySQL 可直接利用 (…, create_at) 索引范围扫描
+        if descending:
+            statement = statement.where(
+                (model.create_at < create_at) | ((model.create_at == create_at) & (model.id < id))
+            )
+        else:
+            statement = statement.where(
+                (model.create_at > create_at) | ((model.create_at == create_at) & (model.id > id))
+            )
+
+    # 多取一条判断是否还有下一页
+    rows = (await session.exec(statement.limit(params.size + 1))).all()
+    next_cursor = None
+    if len(rows) > params.size:
+        rows = rows[: params.size]
+        next_cursor = encode_cursor(rows[-1].create_at, rows[-1].id)
+    items = await transformer(rows) if transformer else rows
+    return CursorPage(items=items, size=params.size, next_cursor=next_cursor)
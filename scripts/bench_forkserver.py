@@ -0,0 +1,59 @@
+"""对比冷启动（subprocess）与预热 fork server 的单次脚本执行延迟
+
+用法（需与 worker 相同的环境变量）：
+    python scripts/bench_forkserver.py [-n 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.tasks.task import SAFE_COMMANDS, run_in_forkserver, run_process, get_forkserver  # noqa: E402
+
+SCRIPT = """
+import json, re, datetime, collections, csv, decimal, logging, urllib.request
+print(json.dumps({"now": datetime.datetime.now().isoformat()}))
+"""
+
+
+def bench(name: str, run, n: int):
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        stdout, stderr, returncode, _ = run()
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert returncode == 0, stderr
+    latencies.sort()
+    print(
+        f"{name:<12} mean={statistics.mean(latencies):7.2f}ms "
+        f"p50={latencies[len(latencies) // 2]:7.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=50)
+    options = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(SCRIPT)
+    try:
+        print(f"preload: {','.join(settings.FORKSERVER_PRELOAD)}")
+        bench("subprocess", lambda: run_process([*SAFE_COMMANDS["python"], f.name], 10), options.n)
+        # 启动耗时不计入单次延迟
+        get_forkserver().start()
+        bench("forkserver", lambda: run_in_forkserver(f.name, [], 10), options.n)
+    finally:
+        get_forkserver().stop()
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""登录吞吐基准：并发登录的同时探测其他接口的延迟
+
+对运行中的服务执行，分别以 PASSWORD_HASH_WORKERS=0（线程池校验）与 >0（进程池校验）启动服务对比：
+    python scripts/bench_login.py --url http://localhost:8000 --username admin --password secret -c 50 -n 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def summary(latencies: list[float]) -> str:
+    if not latencies:
+        return "n/a"
+    latencies = sorted(latencies)
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    return f"p50={statistics.median(latencies):.1f}ms p95={p95:.1f}ms max={latencies[-1]:.1f}ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("--probe", default="/api/v1/users/me", help="登录压测期间探测延迟的接口")
+    options = parser.parse_args()
+
+    login_url = "/api/v1/login/access-token"
+    form = {"username": options.username, "password": options.password}
+    limits = httpx.Limits(max_connections=options.concurrency + 1)
+    async with httpx.AsyncClient(base_url=options.url, limits=limits, timeout=60) as client:
+        response = await client.post(login_url, data=form)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        remaining = options.requests
+        login_latencies, statuses = [], {}
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await client.post(login_url, data=form)
+                login_latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get(options.probe, headers=headers)
+                probe_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(options.concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"logins: {options.requests} in {elapsed:.2f}s ({options.requests / elapsed:.1f}/s), status {statuses}")
+    print(f"login latency: {summary(login_latencies)}")
+    print(f"probe {options.probe}: {summary(probe_latencies)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
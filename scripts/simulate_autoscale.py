@@ -0,0 +1,126 @@
+"""模拟进程池伸缩：以 kombu 内存 broker 代替 Redis，按模拟时钟驱动 AutoscaleController
+
+对比固定进程数与伸缩策略在突发积压、接近满载的波动负载下的排队等待、积压清空时间、
+进程占用（进程·秒）与伸缩次数。无需 Redis 与数据库：
+    python scripts/simulate_autoscale.py [--scenario burst|steady|diurnal] [--min 2] [--max 16]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+
+from kombu import Connection, Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.tasks.autoscale import AutoscaleController, AutoscalePolicy, queue_backlog, wait_p90  # noqa: E402
+
+QUEUE = "jobs.python.normal"
+
+
+def arrivals(scenario: str, t: int, rng: random.Random) -> int:
+    """第 t 秒到达的运行数"""
+    if scenario == "burst":
+        # 前 10 秒批量提交 500 个运行，之后只有零星运行
+        return 50 if t < 10 else int(rng.random() < 0.05)
+    if scenario == "steady":
+        # 平均每秒 0.9 个，接近 8 个进程的处理能力（平均耗时 10 秒时约 0.8 个/秒）
+        return sum(rng.random() < 0.09 for _ in range(10))
+    # diurnal：白天（前半段）每秒约 1.2 个，夜间几乎没有
+    return sum(rng.random() < 0.12 for _ in range(10)) if t % 3600 < 1800 else int(rng.random() < 0.01)
+
+
+def simulate(scenario: str, policy: AutoscalePolicy | None, fixed: int, duration: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    controller = AutoscaleController(policy) if policy else None
+    processes = policy.min_processes if policy else fixed
+    running: list[float] = []  # 各执行中任务的结束时间
+    waits: list[tuple[int, float]] = []
+    process_seconds = scale_events = peak = 0
+    drained_at = None
+
+    with Connection("memory://") as connection:
+        channel = connection.default_channel
+        producer = connection.Producer(channel)
+        queue = Queue(QUEUE)
+        # 内存 broker 的状态在进程内共享，清空上一轮模拟剩余的消息
+        queue(channel).declare()
+        channel.queue_purge(QUEUE)
+        for t in range(duration):
+            for _ in range(arrivals(scenario, t, rng)):
+                producer.publish({"sent_at": t, "runtime": rng.uniform(5, 15)}, routing_key=QUEUE, declare=[queue])
+
+            running = [end for end in running if end > t]
+            while len(running) < processes:
+                message = channel.basic_get(QUEUE, no_ack=True)
+                if message is None:
+                    break
+                body = message.decode()
+                waits.append((t, t - body["sent_at"]))
+                running.append(t + body["runtime"])
+
+            backlog = queue_backlog(channel, [QUEUE])
+            if scenario == "burst" and drained_at is None and t >= 10 and backlog == 0:
+                drained_at = t
+            if controller and t % int(settings.AUTOSCALE_INTERVAL) == 0:
+                recent = [wait for started_at, wait in waits if started_at >= t - settings.AUTOSCALE_WAIT_WINDOW]
+                target = controller.decide(processes, len(running), backlog, wait_p90(recent), t)
+                if target < processes:
+                    # 与 prefork 池一致，执行中的进程不会被回收
+                    target = max(target, len(running))
+                if target != processes:
+                    scale_events += 1
+                    processes = target
+            process_seconds += processes
+            peak = max(peak, processes)
+
+    values = [wait for _, wait in waits]
+    quantiles = statistics.quantiles(values, n=20) if len(values) > 1 else [0] * 19
+    return {
+        "started": len(values),
+        "wait_p50": quantiles[9],
+        "wait_p95": quantiles[18],
+        "drained_at": drained_at,
+        "process_hours": process_seconds / 3600,
+        "peak": peak,
+        "scale_events": scale_events,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=["burst", "steady", "diurnal"], default="burst")
+    parser.add_argument("--min", type=int, default=2, help="最小进程数")
+    parser.add_argument("--max", type=int, default=16, help="最大进程数")
+    parser.add_argument("--duration", type=int, default=7200, help="模拟秒数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    policy = AutoscalePolicy(
+        min_processes=args.min,
+        max_processes=args.max,
+        backlog_per_process=settings.AUTOSCALE_BACKLOG_PER_PROCESS,
+        max_wait=settings.AUTOSCALE_MAX_WAIT,
+        up_ticks=settings.AUTOSCALE_UP_TICKS,
+        down_delay=settings.AUTOSCALE_DOWN_DELAY,
+    )
+    print(f"scenario={args.scenario} duration={args.duration}s")
+    for name, kwargs in [
+        (f"fixed={args.min}", {"policy": None, "fixed": args.min}),
+        (f"fixed={args.max}", {"policy": None, "fixed": args.max}),
+        (f"auto={args.min}..{args.max}", {"policy": policy, "fixed": 0}),
+    ]:
+        result = simulate(args.scenario, duration=args.duration, seed=args.seed, **kwargs)
+        drained = f"{result['drained_at']}s" if result["drained_at"] is not None else "-"
+        print(
+            f"{name:<12} started={result['started']:<5} wait p50={result['wait_p50']:6.1f}s "
+            f"p95={result['wait_p95']:6.1f}s drained={drained:<6} process_hours={result['process_hours']:6.2f} "
+            f"peak={result['peak']:<3} scale_events={result['scale_events']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,15 @@
-celery -A app.celery worker --concurrency=2  --loglevel=INFO
\ No newline at end of file
+#!/bin/sh
+# CELERY_QUEUES：消费的队列（逗号分隔），默认消费默认队列及全部脚本类型、优先级的脚本队列（见 JobService.job_queues）
+# 例如交互式任务专用的 worker：CELERY_QUEUES=jobs.python.high,jobs.shell.high
+QUEUES=${CELERY_QUEUES:-celery,jobs.python.high,jobs.python.normal,jobs.python.low,jobs.shell.high,jobs.shell.normal,jobs.shell.low}
+# CELERY_AUTOSCALE：进程数上下限（最大,最小），按队列积压伸缩，例如 16,2；未设置时使用固定的 CELERY_CONCURRENCY
+if [ -n "$CELERY_AUTOSCALE" ]; then
+  POOL="--autoscale=$CELERY_AUTOSCALE"
+else
+  POOL="--concurrency=${CELERY_CONCURRENCY:-2}"
+fi
+# CELERY_HOSTNAME：固定的节点名（如 worker1@%h），负载感知投递的专属队列按节点名区分
+if [ -n "$CELERY_HOSTNAME" ]; then
+  NAME="-n $CELERY_HOSTNAME"
+fi
+celery -A app.celery worker $POOL $NAME -Q "$QUEUES" --loglevel=INFO